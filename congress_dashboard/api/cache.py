@@ -0,0 +1,430 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+import contextlib
+import copy
+import functools
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core import cache as django_cache
+from openstack_dashboard.api import base
+from oslo_log import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+KEY_PREFIX = 'congress'
+
+# Default time to live, in seconds, of each kind of shared cache entry. Kinds
+# such as 'policy_tables' and 'datasource_tables' share the 'tables' TTL.
+DEFAULT_TTLS = {
+    'policies': 30,
+    'datasources': 30,
+    'drivers': 300,
+    'tables': 60,
+    'schemas': 300,
+    'catalog': 60,
+    'library': 300,
+}
+
+# Number of entries of each kind kept in process for kinds cached locally
+# when the shared cache is disabled.
+LOCAL_CACHE_SIZE = 32
+
+_memo_lock = threading.Lock()
+_deferred_lock = threading.Lock()
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+
+class RequestMemo(object):
+    """Results of Congress API reads made while serving one request."""
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        with self._lock:
+            try:
+                value = self._results[key]
+            except KeyError:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, value
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._results
+
+    def store(self, key, value):
+        with self._lock:
+            self._results[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._results)}
+
+
+def get_request_memo(request):
+    """Return the memo attached to the request, creating it if needed."""
+    memo = getattr(request, '_congress_memo', None)
+    if memo is None:
+        with _memo_lock:
+            memo = getattr(request, '_congress_memo', None)
+            if memo is None:
+                memo = RequestMemo()
+                request._congress_memo = memo
+    return memo
+
+
+def clone(value):
+    """Copy an API result so callers can mutate it without side effects.
+
+    Views freely call set_value() and friends on the wrappers they get back,
+    so a memoized result must never be handed out twice.
+    """
+    if hasattr(type(value), '__copy__'):
+        return copy.copy(value)
+    if isinstance(value, base.APIDictWrapper):
+        return type(value)(clone(value._apidict))
+    if isinstance(value, dict):
+        return dict((k, clone(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [clone(v) for v in value]
+    return value
+
+
+def _make_key(func, args, kwargs):
+    return (func.__name__, args, tuple(sorted(kwargs.items())))
+
+
+def memoized_per_request(func):
+    """Memoize a read function for the lifetime of the request.
+
+    The first argument of the decorated function must be the request.
+    """
+    @functools.wraps(func)
+    def wrapped(request, *args, **kwargs):
+        memo = get_request_memo(request)
+        try:
+            key = _make_key(func, args, kwargs)
+            hash(key)
+        except TypeError:
+            return func(request, *args, **kwargs)
+
+        found, value = memo.lookup(key)
+        if found:
+            return clone(value)
+        value = func(request, *args, **kwargs)
+        memo.store(key, clone(value))
+        return value
+    return wrapped
+
+
+def is_memoized(request, func, *args, **kwargs):
+    """Return whether a memoized read already ran for this request."""
+    return get_request_memo(request).contains(_make_key(func, args, kwargs))
+
+
+def shared_cache_enabled():
+    return getattr(settings, 'CONGRESS_CACHE_ENABLED', False)
+
+
+def get_shared_cache():
+    alias = getattr(settings, 'CONGRESS_CACHE_ALIAS', 'default')
+    return django_cache.caches[alias]
+
+
+def _get_ttl(kind):
+    ttls = dict(DEFAULT_TTLS)
+    ttls.update(getattr(settings, 'CONGRESS_CACHE_TTL', {}))
+    return ttls.get(kind, ttls.get(kind.split('_')[-1]))
+
+
+def _get_scope(request):
+    user = request.user
+    return '%s:%s' % (user.tenant_id, user.services_region)
+
+
+def get_scope_hash(request, value):
+    """Hash a value together with the request's project and region."""
+    return _hash((_get_scope(request), value))
+
+
+def _hash(value):
+    return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()
+
+
+def _generation_key(kind, scope, subject=None):
+    if subject is None:
+        return '%s:gen:%s:%s' % (KEY_PREFIX, kind, _hash(scope))
+    return '%s:gen:%s:%s' % (KEY_PREFIX, kind, _hash((scope, subject)))
+
+
+def _get_generations(shared, keys):
+    """Return the current generation for each key, creating missing ones.
+
+    Entries embed the generations of their kind and subject in their own
+    key, so bumping a generation orphans exactly the entries it covers. New
+    generations are random, which means an evicted generation can never
+    bring stale entries back to life.
+    """
+    generations = shared.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            gen = uuid.uuid4().hex
+            if not shared.add(key, gen, None):
+                gen = shared.get(key) or gen
+            generations[key] = gen
+    return [generations[key] for key in keys]
+
+
+def _get_local_cache(kind):
+    with _local_caches_lock:
+        local_cache = _local_caches.get(kind)
+        if local_cache is None:
+            local_cache = _local_caches[kind] = LRU(LOCAL_CACHE_SIZE)
+        return local_cache
+
+
+def shared(kind, subject=None, local=False):
+    """Cache a read function's result across requests and processes.
+
+    Results are stored in the Django cache named by CONGRESS_CACHE_ALIAS for
+    the kind's TTL, scoped by project and region. 'subject' is the index,
+    after the request, of the positional argument naming the policy or data
+    source the result belongs to, so that writes can invalidate it alone.
+    Caching is opt-in through CONGRESS_CACHE_ENABLED.
+
+    When it is disabled and 'local' is set, results are kept in process for
+    the kind's TTL instead. They are handed out as is, so callers must not
+    modify them.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(request, *args, **kwargs):
+            if not shared_cache_enabled():
+                if not local:
+                    return func(request, *args, **kwargs)
+                return _call_locally(kind, func, request, args, kwargs)
+
+            shared_cache = get_shared_cache()
+            scope = _get_scope(request)
+            gen_keys = [_generation_key(kind, scope)]
+            if subject is not None:
+                gen_keys.append(_generation_key(kind, scope, args[subject]))
+            generations = _get_generations(shared_cache, gen_keys)
+            key = '%s:%s:%s' % (KEY_PREFIX, kind, _hash(
+                (scope, generations, _make_key(func, args, kwargs))))
+
+            value = shared_cache.get(key)
+            if value is not None:
+                return value
+            value = func(request, *args, **kwargs)
+            shared_cache.set(key, value, _get_ttl(kind))
+            return value
+        return wrapped
+    return decorator
+
+
+def _call_locally(kind, func, request, args, kwargs):
+    try:
+        key = (_get_scope(request), _make_key(func, args, kwargs))
+        hash(key)
+    except TypeError:
+        return func(request, *args, **kwargs)
+
+    local_cache = _get_local_cache(kind)
+    entry = local_cache.get(key)
+    if entry is not None and entry[0] > time.time():
+        return entry[1]
+    value = func(request, *args, **kwargs)
+    local_cache.put(key, (time.time() + _get_ttl(kind), value))
+    return value
+
+
+def invalidate(request, kind, subject=None):
+    """Drop cached entries of a kind, or of one of its subjects.
+
+    Entries of kinds kept in process are dropped whatever the subject, and
+    only from this process. Other processes keep theirs until they expire.
+    """
+    deferred = getattr(request, '_congress_deferred', None)
+    if deferred is not None:
+        with _deferred_lock:
+            deferred.add((kind, subject))
+        return
+    local_cache = _local_caches.get(kind)
+    if local_cache is not None:
+        local_cache.clear()
+    if not shared_cache_enabled():
+        return
+    key = _generation_key(kind, _get_scope(request), subject)
+    get_shared_cache().set(key, uuid.uuid4().hex, None)
+
+
+def invalidates(*targets):
+    """Invalidate cached reads once the decorated write has been sent.
+
+    The request's memo is always cleared. Each target is a (kind, subject)
+    pair for the shared cache, where subject is the index, after the
+    request, of the argument naming the affected policy or data source, or
+    None to invalidate the whole kind.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(request, *args, **kwargs):
+            try:
+                return func(request, *args, **kwargs)
+            finally:
+                if getattr(request, '_congress_deferred', None) is None:
+                    memo = get_request_memo(request)
+                    LOG.debug('Clearing Congress request memo after %s: %s',
+                              func.__name__, memo.stats())
+                    memo.clear()
+                for kind, subject in targets:
+                    invalidate(request, kind,
+                               None if subject is None else args[subject])
+        return wrapped
+    return decorator
+
+
+@contextlib.contextmanager
+def deferred_invalidation(request):
+    """Invalidate cached reads once, after a batch of writes.
+
+    While the context is active, invalidations made from any thread on
+    behalf of the request, including those of writes decorated with
+    invalidates(), are only recorded. On exit, the request's memo is cleared
+    and each distinct target is invalidated once.
+    """
+    if getattr(request, '_congress_deferred', None) is not None:
+        yield
+        return
+    deferred = set()
+    request._congress_deferred = deferred
+    try:
+        yield
+    finally:
+        request._congress_deferred = None
+        memo = get_request_memo(request)
+        LOG.debug('Clearing Congress request memo after a batch of writes: '
+                  '%s', memo.stats())
+        memo.clear()
+        for kind, subject in deferred:
+            invalidate(request, kind, subject)
+
+
+class LRU(object):
+    """Process-local, thread-safe mapping of at most 'size' entries.
+
+    Once full, storing a new entry evicts the least recently used one.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def items(self):
+        with self._lock:
+            return list(self._entries.items())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class VersionedLRU(object):
+    """Process-local LRU cache of large values tagged with a version.
+
+    A lookup only hits when the caller's current version of the key matches
+    the version the value was stored with, so entries go stale exactly when
+    their source changes. The estimated size of all values is kept under
+    max_bytes by evicting the least recently used entries.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, value, size):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (version, value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._entries), 'bytes': self.size}
@@ -0,0 +1,130 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+from concurrent import futures
+import threading
+import time
+
+from django.conf import settings
+from oslo_log import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+# Defaults for concurrent Congress API calls, overridable in local_settings.
+MAX_WORKERS = 8
+CALL_TIMEOUT = 30
+
+Outcome = collections.namedtuple('Outcome', ['value', 'error'])
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+class CallTimeout(Exception):
+    """A concurrent call did not complete in time."""
+
+
+def get_executor():
+    """Return the process-wide executor used for Congress API calls."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_workers = getattr(settings, 'CONGRESS_MAX_WORKERS',
+                                      MAX_WORKERS)
+                _executor = futures.ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix='congress')
+    return _executor
+
+
+def _call(func, item):
+    try:
+        return Outcome(func(item), None)
+    except Exception as e:
+        return Outcome(None, e)
+
+
+def _call_in_worker(func, item, started):
+    started.append(time.time())
+    _local.in_worker = True
+    try:
+        return _call(func, item)
+    finally:
+        _local.in_worker = False
+
+
+def map_isolated(func, items, limit=None, timeout=None):
+    """Call func on every item concurrently, isolating failures.
+
+    At most 'limit' calls run at once and each one is given 'timeout'
+    seconds from when it starts running, so that calls waiting for a thread
+    of the shared executor don't time out. Returns one Outcome per item, in
+    the order of the items, whose error is set instead of its value when
+    the call raised or timed out. A call which timed out can't be
+    interrupted: it keeps its executor thread until it returns.
+
+    Calls made from a worker thread run serially in that thread, so nested
+    fan-outs can never exhaust the shared executor and deadlock.
+    """
+    items = list(items)
+    if getattr(_local, 'in_worker', False) or len(items) < 2:
+        return [_call(func, item) for item in items]
+
+    if limit is None:
+        limit = getattr(settings, 'CONGRESS_MAX_WORKERS', MAX_WORKERS)
+    if timeout is None:
+        timeout = getattr(settings, 'CONGRESS_CALL_TIMEOUT', CALL_TIMEOUT)
+
+    executor = get_executor()
+    outcomes = [None] * len(items)
+    queue = iter(enumerate(items))
+    # Future: (index, list holding the time the call started, once it has).
+    pending = {}
+
+    def submit_next():
+        for index, item in queue:
+            started = []
+            future = executor.submit(_call_in_worker, func, item, started)
+            pending[future] = (index, started)
+            return
+
+    for _ in range(max(limit, 1)):
+        submit_next()
+
+    while pending:
+        # Calls which haven't started can't time out before now + timeout.
+        now = time.time()
+        deadline = min([s[0] + timeout for i, s in pending.values() if s] +
+                       [now + timeout])
+        done, not_done = futures.wait(list(pending),
+                                      timeout=max(deadline - now, 0),
+                                      return_when=futures.FIRST_COMPLETED)
+        for future in done:
+            index, started = pending.pop(future)
+            outcomes[index] = future.result()
+            submit_next()
+
+        now = time.time()
+        for future in not_done:
+            index, started = pending[future]
+            if started and started[0] + timeout <= now:
+                del pending[future]
+                LOG.warning('Call for item %s timed out after %s seconds',
+                            items[index], timeout)
+                outcomes[index] = Outcome(None, CallTimeout(
+                    'Timed out after %s seconds' % timeout))
+                submit_next()
+    return outcomes
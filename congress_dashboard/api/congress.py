@@ -12,24 +12,99 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import codecs
+import functools
+import json
+import re
+import sys
+import threading
+import time
+
 from congressclient.v1 import client as congress_client
 from django.conf import settings
+from django.template.defaultfilters import linebreaksbr
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from horizon import exceptions
+from keystoneauth1 import adapter as ksadapter
 # import keystoneauth1.identity.v2 as v2
 import keystoneauth1.identity.v3 as v3
 import keystoneauth1.session as kssession
+from keystoneauth1 import token_endpoint
 from openstack_dashboard.api import base
 from oslo_log import log as logging
+import requests
+from requests import adapters
+
+from congress_dashboard.api import cache
+from congress_dashboard.api import concurrency
+from congress_dashboard.api import datalog
 
 
 LITERALS_SEPARATOR = '),'
-RULE_SEPARATOR = ':-'
+RULE_SEPARATOR = datalog.RULE_SEPARATOR
 TABLE_SEPARATOR = ':'
 
+# Number of seconds a table snapshot is kept for paging through it.
+ROWS_SNAPSHOT_TTL = 120
+
+# Default budget, in bytes, of the process-local table snapshots.
+ROWS_SNAPSHOTS_MAX_BYTES = 64 * 1024 * 1024
+
+# Default budget, in bytes, of the process-local data source rows cache.
+ROWS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Size of the chunks read from streamed responses.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Number of distinct rules whose HTML rendering is kept.
+RULE_HTML_CACHE_SIZE = 4096
+
+# CSS classes used to highlight rule tokens.
+_HIGHLIGHT_CLASSES = {
+    'keyword': 'rule-keyword',
+    'table': 'rule-table',
+    'variable': 'rule-variable',
+    'string': 'rule-string',
+    'number': 'rule-number',
+    'separator': 'rule-separator',
+}
+
+# Defaults for the pool of Congress clients, overridable in local_settings.
+CLIENT_POOL_SIZE = 64
+CLIENT_POOL_TTL = 3600
+HTTP_POOL_SIZE = 32
+# Stop handing out a pooled client this many seconds before its token expires.
+TOKEN_EXPIRY_MARGIN = 60
+
 LOG = logging.getLogger(__name__)
 
 
 def format_rule(rule):
     """Make rule's text more human readable."""
+    try:
+        if _has_comments(rule):
+            # The parser drops comments, so keep the rule's own text.
+            return _split_rule(rule)
+        parsed = datalog.parse_rule(rule)
+    except datalog.DatalogSyntaxError:
+        return _split_rule(rule)
+    if not parsed.body:
+        return rule
+
+    # Add newline after the head and after each literal in the body.
+    head = ', '.join(lit.text for lit in parsed.heads)
+    body = ',\n'.join(lit.text for lit in parsed.body)
+    return '%s %s\n%s' % (head, RULE_SEPARATOR, body)
+
+
+def _has_comments(rule):
+    return any(token.kind == 'comment'
+               for token in datalog.tokenize(rule, comments=True))
+
+
+def _split_rule(rule):
+    # Best effort formatting for rules the parser doesn't understand.
     head_body = rule.split(RULE_SEPARATOR)
     if len(head_body) < 2:
         return rule
@@ -52,6 +127,82 @@ def format_rule(rule):
     return rules_break.join([head, new_body])
 
 
+def format_rule_html(rule):
+    """Render a rule as safe HTML, one body literal per line.
+
+    Meant to be used as a table column filter. Renderings are cached by rule
+    text, so unchanged rules are only formatted and escaped once. Tokens are
+    wrapped in CSS classes when CONGRESS_RULE_HIGHLIGHTING is enabled.
+    """
+    if not rule:
+        return rule
+    highlight = getattr(settings, 'CONGRESS_RULE_HIGHLIGHTING', False)
+    return _render_rule_html(rule, highlight)
+
+
+@functools.lru_cache(maxsize=RULE_HTML_CACHE_SIZE)
+def _render_rule_html(rule, highlight):
+    try:
+        tokens = datalog.tokenize(rule, comments=True)
+    except datalog.DatalogSyntaxError:
+        tokens = None
+    if (not tokens or not any(t.kind == 'separator' for t in tokens) or
+            any(t.kind == 'comment' for t in tokens)):
+        # Comments are shown as written rather than highlighted.
+        return linebreaksbr(format_rule(rule))
+
+    def wrap(kind, text):
+        text = escape(text)
+        if highlight:
+            return '<span class="%s">%s</span>' % (_HIGHLIGHT_CLASSES[kind],
+                                                   text)
+        return text
+
+    html = []
+    depth = 0
+    in_body = False
+    line_start = False
+    previous_end = tokens[0].start
+    for i, token in enumerate(tokens):
+        # Keep the original spacing between tokens, minus the line breaks
+        # and the indentation at the start of each formatted line.
+        gap = rule[previous_end:token.start]
+        if gap and not line_start:
+            html.append(' ')
+        previous_end = token.end
+        line_start = False
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+
+        if token.kind == 'separator':
+            html.append(wrap('separator', token.value) + '<br>')
+            in_body = True
+            line_start = True
+        elif token.kind == 'punct':
+            if token.value in '([':
+                depth += 1
+            elif token.value in ')]':
+                depth -= 1
+            html.append(escape(token.value))
+            if token.value == ',' and depth == 0 and in_body:
+                html.append('<br>')
+                line_start = True
+        elif token.kind == 'name':
+            if depth == 0 and token.value == datalog.NEGATION:
+                html.append(wrap('keyword', token.value))
+            elif following is not None and following.value == '[':
+                html.append(wrap('keyword', token.value))
+            elif depth == 0 or (following is not None and
+                                following.value == '('):
+                html.append(wrap('table', token.value))
+            else:
+                html.append(wrap('variable', token.value))
+        elif token.kind in ('string', 'number'):
+            html.append(wrap(token.kind, token.value))
+        else:
+            html.append(escape(token.value))
+    return mark_safe(''.join(html))
+
+
 def _set_id_as_name_if_empty(apidict, length=0):
     try:
         if not apidict._apidict.get('name'):
@@ -81,6 +232,132 @@ class PolicyAPIDictWrapper(base.APIDictWrapper):
         del self._apidict[key]
 
 
+class RowHeader(object):
+    """Column names shared by all the rows of a table."""
+    __slots__ = ('indexes',)
+
+    def __init__(self, names=()):
+        self.indexes = dict((name, i) for i, name in enumerate(names))
+
+
+class TableRow(object):
+    """Compact row of a policy or data source table.
+
+    Values stay in the list decoded from the API response. Column values are
+    exposed as attributes, as Horizon's DataTable expects, through a header
+    shared with the other rows of the table.
+    """
+    __slots__ = ('_id', '_values', '_header')
+
+    def __init__(self, id, values, header):
+        self._id = id
+        self._values = values
+        self._header = header
+
+    @property
+    def id(self):
+        # A column named 'id' takes precedence over the generated row id.
+        index = self._header.indexes.get('id')
+        if index is not None and index < len(self._values):
+            return self._values[index]
+        return self._id
+
+    def __getattr__(self, name):
+        # Only called for names that aren't slots. Private names are never
+        # columns, and must fail fast while the slots are unset (unpickling).
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._values[self._header.indexes[name]]
+        except (KeyError, IndexError):
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key == 'id' or key in self._header.indexes
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return '<TableRow: %s %s>' % (self._id, self._values)
+
+
+class TableRows(list):
+    """Rows of a policy or data source table, sharing one header."""
+
+    def __init__(self, results=()):
+        super(TableRows, self).__init__()
+        self.header = RowHeader()
+        # Rows from the API don't have ids. However, the DataTable object
+        # requires an id for the table to get rendered properly. Otherwise,
+        # the same contents are displayed for every row in the table. Assign
+        # the rows ids here.
+        header = self.header
+        self.offset = 0
+        self.extend(TableRow(_get_row_id(row, i), row.get('data', []), header)
+                    for i, row in enumerate(results))
+
+    def set_columns(self, names):
+        """Name the values of every row, in order."""
+        self.header.indexes = RowHeader(names).indexes
+
+    def __copy__(self):
+        return self.slice(0, len(self))
+
+    def slice(self, start, end):
+        """Return rows [start, end) with their own header.
+
+        The returned rows remember their offset in this table, so that it
+        can be used to page through it.
+        """
+        rows = TableRows()
+        rows.header.indexes = dict(self.header.indexes)
+        rows.offset = start
+        rows.extend(TableRow(row._id, row._values, rows.header)
+                    for row in self[start:end])
+        return rows
+
+
+def _get_row_id(row, default):
+    id = row.get('id')
+    if not id or id == "None":
+        return default
+    return id
+
+
+class ResourceIndex(object):
+    """Constant time lookups by id and by name over policies or data sources.
+
+    Built once from a list response. When several items share an id or a
+    name, the first one wins, matching what a scan of the list would return.
+    """
+
+    def __init__(self, items):
+        self._by_id = {}
+        self._by_name = {}
+        for item in items:
+            self._by_id.setdefault(item.get('id'), item)
+            self._by_name.setdefault(item.get('name'), item)
+
+    def get_by_id(self, id):
+        return self._by_id.get(id)
+
+    def get_by_name(self, name):
+        return self._by_name.get(name)
+
+    def __len__(self):
+        return len(self._by_id)
+
+
 class PolicyRule(PolicyAPIDictWrapper):
     """Wrapper for a Congress policy's rule."""
     def set_id_as_name_if_empty(self):
@@ -95,29 +372,171 @@ class PolicyTable(PolicyAPIDictWrapper):
         self._apidict['policy_description'] = policy['description']
 
 
+class ClientPool(object):
+    """Bounded, thread-safe LRU pool of Congress clients.
+
+    Clients are keyed by (token id, project id, region) and evicted when the
+    token they were built from is about to expire, when they have been
+    pooled longer than the configured TTL, or when the pool is full.
+    """
+
+    def __init__(self):
+        self._clients = cache.LRU(CLIENT_POOL_SIZE)
+
+    def get(self, key, expires_at, factory):
+        now = time.time()
+        entry = self._clients.get(key)
+        if entry is not None:
+            client, expiry = entry
+            if expiry > now:
+                return client
+            self._clients.pop(key)
+
+        # Build without holding the pool's lock; constructing a client does no
+        # I/O but there is no reason to serialize it either.
+        client = factory()
+        ttl = getattr(settings, 'CONGRESS_CLIENT_POOL_TTL', CLIENT_POOL_TTL)
+        expiry = min(expires_at, now + ttl)
+        self._clients.size = getattr(settings, 'CONGRESS_CLIENT_POOL_SIZE',
+                                     CLIENT_POOL_SIZE)
+        self._clients.put(key, (client, expiry))
+        for k, (c, e) in self._clients.items():
+            if e <= now:
+                self._clients.pop(k)
+        return client
+
+    def clear(self):
+        self._clients.clear()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+_client_pool = ClientPool()
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def _get_http_session():
+    """Return the process-wide HTTP session shared by all Congress clients.
+
+    Sharing one requests session keeps TCP/TLS connections to Congress and
+    keystone alive across clients built for different tokens.
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                pool_size = getattr(settings, 'CONGRESS_HTTP_POOL_SIZE',
+                                    HTTP_POOL_SIZE)
+                session = requests.Session()
+                adapter = adapters.HTTPAdapter(pool_connections=pool_size,
+                                               pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _http_session = session
+    return _http_session
+
+
+def _token_expiry(token):
+    """Return the token's expiry as a timestamp, minus a safety margin."""
+    expires = getattr(token, 'expires', None)
+    if expires is None:
+        return float('inf')
+    try:
+        return expires.timestamp() - TOKEN_EXPIRY_MARGIN
+    except AttributeError:
+        return float('inf')
+
+
 def congressclient(request):
-    """Instantiate Congress client."""
-    auth_url = getattr(settings, 'OPENSTACK_KEYSTONE_URL')
+    """Get a pooled Congress client for the request's token and region."""
     user = request.user
-    session = get_keystone_session(auth_url, user)
     region_name = user.services_region
+    key = (user.token.id, user.tenant_id, region_name)
+    return _client_pool.get(key, _token_expiry(user.token),
+                            lambda: _create_congressclient(request))
+
+
+def _get_catalog_endpoint(request):
+    """Return the Congress endpoint from Horizon's cached service catalog."""
+    try:
+        return base.url_for(request, 'policy', endpoint_type='publicURL')
+    except exceptions.ServiceCatalogException:
+        return None
 
+
+def _create_congressclient(request):
+    """Instantiate Congress client."""
+    user = request.user
+    region_name = user.services_region
     kwargs = {
-        'session': session,
         'auth': None,
         'interface': 'publicURL',
         'service_type': 'policy',
         'region_name': region_name
     }
+
+    endpoint = _get_catalog_endpoint(request)
+    if endpoint:
+        # The user's token is already scoped and the endpoint is known, so
+        # there is no need to go back to keystone before calling Congress.
+        kwargs['session'] = get_token_endpoint_session(endpoint, user)
+        kwargs['endpoint_override'] = endpoint
+    else:
+        LOG.debug('No policy endpoint in the service catalog for region %s, '
+                  'authenticating against keystone', region_name)
+        auth_url = getattr(settings, 'OPENSTACK_KEYSTONE_URL')
+        kwargs['session'] = get_keystone_session(auth_url, user)
     return congress_client.Client(**kwargs)
 
 
+def _get_http_timeout():
+    """Return the number of seconds an HTTP request may wait for Congress.
+
+    Concurrent calls only time out once they run, and a timed-out call
+    keeps its executor thread, so requests themselves must not hang.
+    """
+    return getattr(settings, 'CONGRESS_CALL_TIMEOUT',
+                   concurrency.CALL_TIMEOUT)
+
+
+def service_congressclient(credentials):
+    """Get a Congress client authenticated with service credentials.
+
+    Used by work done outside of any user request, such as the violations
+    collector. 'credentials' holds the keystone v3 password authentication
+    options, plus an optional 'region_name'.
+    """
+    credentials = dict(credentials)
+    region_name = credentials.pop('region_name', None)
+    credentials.setdefault('auth_url',
+                           getattr(settings, 'OPENSTACK_KEYSTONE_URL'))
+    auth = v3.Password(**credentials)
+    session = kssession.Session(auth=auth, session=_get_http_session(),
+                                timeout=_get_http_timeout())
+    return congress_client.Client(session=session, auth=None,
+                                  interface='publicURL',
+                                  service_type='policy',
+                                  region_name=region_name)
+
+
 def get_keystone_session(auth_url, user):
     auth = v3.Token(auth_url, user.token.id, project_id=user.tenant_id)
-    session = kssession.Session(auth=auth)
+    session = kssession.Session(auth=auth, session=_get_http_session(),
+                                timeout=_get_http_timeout())
+    return session
+
+
+def get_token_endpoint_session(endpoint, user):
+    auth = token_endpoint.Token(endpoint, user.token.id)
+    session = kssession.Session(auth=auth, session=_get_http_session(),
+                                timeout=_get_http_timeout())
     return session
 
 
+@cache.memoized_per_request
+@cache.shared('policies')
 def policies_list(request):
     """List all policies."""
     client = congressclient(request)
@@ -134,6 +553,7 @@ def policies_list(request):
     return policies
 
 
+@cache.invalidates(('policies', None), ('rule_catalog', None))
 def policy_create(request, args, library_policy_id=None):
     """Create a policy with the given properties."""
     client = congressclient(request)
@@ -141,23 +561,70 @@ def policy_create(request, args, library_policy_id=None):
     return policy
 
 
+def _get_aliases(index_func, request, identifier):
+    """Return the id and name of the item identified by either of them.
+
+    Cached reads of a policy or data source are keyed by whichever of the
+    two their caller used, so writes must invalidate both. Returns [None],
+    which invalidates every item, when the items can't be listed.
+    """
+    try:
+        index = index_func(request)
+    except Exception:
+        return [None]
+    item = index.get_by_id(identifier) or index.get_by_name(identifier)
+    if item is None:
+        return [identifier]
+    return [item['id'], item['name']]
+
+
+@cache.invalidates(('policies', None), ('rule_catalog', None))
 def policy_delete(request, policy_id):
     """Delete a policy by id."""
-    client = congressclient(request)
-    policy = client.delete_policy(policy_id)
-    return policy
+    subjects = _get_aliases(policies_index, request, policy_id)
+    try:
+        client = congressclient(request)
+        policy = client.delete_policy(policy_id)
+        return policy
+    finally:
+        for subject in subjects:
+            cache.invalidate(request, 'policy_tables', subject)
+            cache.invalidate(request, 'policy_schemas', subject)
 
 
-def policy_get(request, policy_name):
-    """Get a policy by name."""
-    # TODO(jwy): Use congress.show_policy() once system policies have unique
-    # IDs.
-    policies = policies_list(request)
-    for p in policies:
-        if p['name'] == policy_name:
-            return p
+@cache.memoized_per_request
+@cache.shared('policies')
+def policies_index(request):
+    """Index all policies by id and name."""
+    return ResourceIndex(policies_list(request))
+
+
+def _use_index(request, index_func, list_func):
+    # A full list is only worth fetching when it will be reused, either later
+    # in this request or by other requests through the shared cache.
+    return (cache.is_memoized(request, index_func) or
+            cache.is_memoized(request, list_func) or
+            cache.shared_cache_enabled())
 
 
+@cache.memoized_per_request
+def policy_get(request, policy_name):
+    """Get a policy by name."""
+    if not _use_index(request, policies_index, policies_list):
+        try:
+            client = congressclient(request)
+            policy = PolicyAPIDictWrapper(client.show_policy(policy_name))
+            if policy.get('name') == policy_name:
+                policy.set_id_if_empty(policy.get('name'))
+                return policy
+        except Exception as e:
+            LOG.debug('Unable to show policy "%s", falling back to the '
+                      'policy list: %s', policy_name, e)
+    return cache.clone(policies_index(request).get_by_name(policy_name))
+
+
+@cache.invalidates(('policy_tables', 0), ('policy_schemas', 0),
+                   ('rule_catalog', None))
 def policy_rule_create(request, policy_name, body=None):
     """Create a rule in the given policy, with the given properties."""
     client = congressclient(request)
@@ -165,6 +632,8 @@ def policy_rule_create(request, policy_name, body=None):
     return rule
 
 
+@cache.invalidates(('policy_tables', 0), ('policy_schemas', 0),
+                   ('rule_catalog', None))
 def policy_rule_delete(request, policy_name, rule_id):
     """Delete a rule by id, from the given policy."""
     client = congressclient(request)
@@ -172,6 +641,7 @@ def policy_rule_delete(request, policy_name, rule_id):
     return rule
 
 
+@cache.memoized_per_request
 def policy_rules_list(request, policy_name):
     """List all rules in a policy, given by name."""
     client = congressclient(request)
@@ -180,6 +650,8 @@ def policy_rules_list(request, policy_name):
     return [PolicyRule(r) for r in results]
 
 
+@cache.memoized_per_request
+@cache.shared('policy_tables', subject=0)
 def policy_tables_list(request, policy_name):
     """List all data tables in a policy, given by name."""
     client = congressclient(request)
@@ -188,53 +660,67 @@ def policy_tables_list(request, policy_name):
     return [PolicyTable(t) for t in results]
 
 
+@cache.memoized_per_request
 def policy_table_get(request, policy_name, table_name):
     """Get a policy table in a policy, given by name."""
     client = congressclient(request)
     return client.show_policy_table(policy_name, table_name)
 
 
+@cache.memoized_per_request
 def policy_rows_list(request, policy_name, table_name):
     """List all rows in a policy's data table, given by name."""
     client = congressclient(request)
     policy_rows_list = client.list_policy_rows(policy_name, table_name)
     results = policy_rows_list['results']
 
-    policy_rows = []
-    # Policy table rows currently don't have ids. However, the DataTable object
-    # requires an id for the table to get rendered properly. Otherwise, the
-    # same contents are displayed for every row in the table. Assign the rows
-    # ids here.
-    id = 0
-    for row in results:
-        new_row = PolicyAPIDictWrapper(row)
-        new_row.set_id_if_empty(id)
-        id += 1
-        policy_rows.append(new_row)
-    return policy_rows
+    return TableRows(results)
 
 
-def policy_table_schema_get(request, policy_name, table_name):
-    """Get the schema for a policy table, based on the first matching rule."""
-    column_names = []
+@cache.memoized_per_request
+@cache.shared('policy_schemas', subject=0)
+def policy_table_schemas_get(request, policy_name):
+    """Get the schemas of all tables defined by a policy's rules.
+
+    The rules are fetched once and every rule head is parsed once, instead
+    of once per table.
+    """
+    schemas = {}
     rules = policy_rules_list(request, policy_name)
-    # There might be multiple rules that use the same name in the head. Pick
-    # the first matching one, which is what the policy engine currently does.
     for rule in rules:
-        rule_def = rule['rule']
-        head, _ = rule_def.split(RULE_SEPARATOR)
-        if head.strip().startswith('%s(' % table_name):
-            start = head.index('(') + 1
-            end = head.index(')')
-            column_names = head[start:end].split(',')
-            break
-
-    schema = {'table_id': table_name}
-    schema['columns'] = [{'name': name.strip(), 'description': None}
-                         for name in column_names]
+        try:
+            parsed = datalog.parse_rule(rule['rule'])
+        except datalog.DatalogSyntaxError as e:
+            LOG.warning('Unable to parse rule %s of policy "%s": %s',
+                        rule.get('id'), policy_name, e)
+            continue
+        for head in parsed.heads:
+            # There might be multiple rules that use the same name in the
+            # head. Pick the first matching one, which is what the policy
+            # engine currently does. Heads under a modal operator, such as
+            # execute[...], call actions rather than define tables.
+            if head.modal or head.table in schemas:
+                continue
+            schemas[head.table] = {
+                'table_id': head.table,
+                'columns': [{'name': name, 'description': None}
+                            for name in head.arguments],
+            }
+    return schemas
+
+
+@cache.memoized_per_request
+def policy_table_schema_get(request, policy_name, table_name):
+    """Get the schema for a policy table, based on the first matching rule."""
+    schemas = policy_table_schemas_get(request, policy_name)
+    schema = schemas.get(table_name)
+    if schema is None:
+        schema = {'table_id': table_name, 'columns': []}
     return schema
 
 
+@cache.memoized_per_request
+@cache.shared('datasources')
 def datasources_list(request):
     """List all the data sources."""
     client = congressclient(request)
@@ -243,23 +729,49 @@ def datasources_list(request):
     return [PolicyAPIDictWrapper(d) for d in datasources]
 
 
+@cache.memoized_per_request
+@cache.shared('datasources')
+def datasources_index(request):
+    """Index all data sources by id and name."""
+    return ResourceIndex(datasources_list(request))
+
+
+def _show_datasource(request, datasource, key):
+    """Get a data source directly, or None if the server can't provide it."""
+    try:
+        client = congressclient(request)
+        result = PolicyAPIDictWrapper(client.show_datasource(datasource))
+        if result.get(key) == datasource:
+            return result
+    except Exception as e:
+        LOG.debug('Unable to show data source "%s", falling back to the '
+                  'data source list: %s', datasource, e)
+    return None
+
+
+@cache.memoized_per_request
 def datasource_get(request, datasource_id):
     """Get a data source by id."""
-    # TODO(jwy): Need API in congress_client to retrieve data source by id.
-    datasources = datasources_list(request)
-    for d in datasources:
-        if d['id'] == datasource_id:
-            return d
+    if not _use_index(request, datasources_index, datasources_list):
+        datasource = _show_datasource(request, datasource_id, 'id')
+        if datasource is not None:
+            return datasource
+    return cache.clone(datasources_index(request).get_by_id(datasource_id))
 
 
+@cache.memoized_per_request
 def datasource_get_by_name(request, datasource_name):
     """Get a data source by name."""
-    datasources = datasources_list(request)
-    for d in datasources:
-        if d['name'] == datasource_name:
-            return d
+    if not _use_index(request, datasources_index, datasources_list):
+        datasource = _show_datasource(request, datasource_name, 'name')
+        if datasource is not None:
+            return datasource
+    return cache.clone(
+        datasources_index(request).get_by_name(datasource_name))
 
 
+@cache.memoized_per_request
+@cache.shared('datasource_tables', subject=0)
 def datasource_tables_list(request, datasource_id):
     """List all data tables in a data source, given by id."""
     client = congressclient(request)
@@ -268,34 +780,270 @@ def datasource_tables_list(request, datasource_id):
     return [PolicyAPIDictWrapper(t) for t in results]
 
 
+_rows_cache = None
+_rows_snapshots = None
+_rows_cache_lock = threading.Lock()
+
+
+def _get_rows_cache():
+    global _rows_cache
+    if _rows_cache is None:
+        with _rows_cache_lock:
+            if _rows_cache is None:
+                max_bytes = getattr(settings, 'CONGRESS_ROWS_CACHE_MAX_BYTES',
+                                    ROWS_CACHE_MAX_BYTES)
+                _rows_cache = cache.VersionedLRU(max_bytes)
+    return _rows_cache
+
+
+def _get_rows_snapshots():
+    global _rows_snapshots
+    if _rows_snapshots is None:
+        with _rows_cache_lock:
+            if _rows_snapshots is None:
+                max_bytes = getattr(settings,
+                                    'CONGRESS_ROWS_SNAPSHOTS_MAX_BYTES',
+                                    ROWS_SNAPSHOTS_MAX_BYTES)
+                _rows_snapshots = cache.VersionedLRU(max_bytes)
+    return _rows_snapshots
+
+
+def _estimate_rows_size(rows):
+    """Roughly estimate the memory used by rows, in bytes."""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sys.getsizeof(row._values)
+        size += sum(sys.getsizeof(value) for value in row._values)
+    return size
+
+
+def _get_datasource_version(request, datasource_id):
+    """Return a version of a data source's data, or None if unknown.
+
+    The number of updates and the time of the last update change every
+    time the data source polls new data.
+    """
+    try:
+        status = datasource_status_list(request, datasource_id)
+    except Exception:
+        return None
+    version = (status.get('number_of_updates'), status.get('last_updated'))
+    if version == (None, None):
+        return None
+    return version
+
+
+@cache.memoized_per_request
 def datasource_rows_list(request, datasource_id, table_name):
-    """List all rows in a data source's data table, given by id."""
+    """List all rows in a data source's data table, given by id.
+
+    Rows are kept in a process-local cache, versioned by the data source's
+    status, so viewing a table again before the data source polls only
+    costs a status call.
+    """
+    rows_cache = None
+    version = None
+    if getattr(settings, 'CONGRESS_ROWS_CACHE_MAX_BYTES',
+               ROWS_CACHE_MAX_BYTES):
+        rows_cache = _get_rows_cache()
+        version = _get_datasource_version(request, datasource_id)
+    key = (cache.get_scope_hash(request, datasource_id), table_name)
+    if version is not None:
+        rows = rows_cache.get(key, version)
+        if rows is not None:
+            # Callers name the columns of the rows they get, so never hand
+            # out the cached rows themselves.
+            return rows.slice(0, len(rows))
+
     client = congressclient(request)
     datasource_rows_list = client.list_datasource_rows(datasource_id,
                                                        table_name)
     results = datasource_rows_list['results']
-    datasource_rows = []
-    id = 0
-    for row in results:
-        new_row = PolicyAPIDictWrapper(row)
-        new_row.set_id_if_empty(id)
-        id += 1
-        datasource_rows.append(new_row)
-    return datasource_rows
+    rows = TableRows(results)
+    if version is not None:
+        rows_cache.put(key, version, rows.slice(0, len(rows)),
+                       _estimate_rows_size(rows))
+        LOG.debug('Data source rows cache: %s', rows_cache.stats())
+    return rows
+
+
+def _get_rows_page(request, fetch, key_args, marker, limit, reverse):
+    """Return a page of rows from a snapshot of a table.
+
+    Congress returns whole tables, so pages are sliced out of a snapshot
+    kept in process. Loading the first page takes a fresh snapshot;
+    following pages reuse it while it lasts, so that pages stay consistent
+    with each other. Snapshots are neither pickled nor subject to the item
+    size limits of a cache backend, but a page served by another process
+    takes a snapshot of its own.
+
+    The marker is the position of the last row of the previous page or, when
+    reverse is True, of the first row of the next page. Returns the rows,
+    whether there are rows before them, and whether there are rows after
+    them.
+    """
+    snapshots = _get_rows_snapshots()
+    key = cache.get_scope_hash(request, key_args)
+    rows = None
+    if marker is not None:
+        # Snapshots all have the same version and expire on their own.
+        snapshot = snapshots.get(key, None)
+        if snapshot is not None and snapshot[0] > time.time():
+            rows = snapshot[1]
+    if rows is None:
+        rows = fetch()
+        ttl = getattr(settings, 'CONGRESS_ROWS_SNAPSHOT_TTL',
+                      ROWS_SNAPSHOT_TTL)
+        snapshots.put(key, None, (time.time() + ttl, rows),
+                      _estimate_rows_size(rows))
+
+    start, end = get_page_bounds(marker, limit, len(rows), reverse)
+    return rows.slice(start, end), start > 0, end < len(rows)
+
+
+def get_page_bounds(marker, limit, size, reverse=False):
+    """Return the (start, end) positions of a page of a sequence.
+
+    The marker is the position of the last item of the previous page or,
+    when reverse is True, of the first item of the next page. Without a
+    valid marker, or when the marker, which comes from the URL, leaves no
+    item on the page, the page is the first one.
+    """
+    try:
+        position = int(marker)
+    except (TypeError, ValueError):
+        position = None
+    if position is not None:
+        if reverse and 0 < position < size:
+            return max(position - limit, 0), position
+        if not reverse and 0 <= position < size - 1:
+            return position + 1, min(position + 1 + limit, size)
+    return 0, min(limit, size)
+
+
+_RESULTS_START = re.compile(r'"results"\s*:\s*\[')
+
+
+def _iter_json_results(chunks):
+    """Yield the items of a {"results": [...]} document from text chunks.
+
+    Items are decoded one at a time as their text arrives, so memory use
+    doesn't depend on the number of items.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    started = False
+    for chunk in chunks:
+        buf = buf[pos:] + chunk
+        pos = 0
+        if not started:
+            match = _RESULTS_START.search(buf)
+            if match is None:
+                continue
+            pos = match.end()
+            started = True
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Incomplete item, wait for more text.
+                break
+            yield item
+    if not started:
+        raise ValueError('No results in Congress response')
+
+
+def _iter_results(client, path):
+    """Stream the items of a Congress list response."""
+    # Go around LegacyJsonAdapter, which would read and decode the whole
+    # body at once.
+    resp = ksadapter.Adapter.request(client.httpclient, path, 'GET',
+                                     stream=True, log=False,
+                                     headers={'Accept': 'application/json'})
+    try:
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        chunks = (decoder.decode(chunk) for chunk in
+                  resp.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+        for item in _iter_json_results(chunks):
+            yield item
+    finally:
+        resp.close()
+
+
+def policy_rows_iter(request, policy_name, table_name):
+    """Yield the values of each row in a policy's data table, as received."""
+    path = congress_client.Client.policy_rows % (policy_name, table_name)
+    for row in _iter_results(congressclient(request), path):
+        yield row.get('data', [])
+
+
+@cache.memoized_per_request
+def policy_rows_count(request, policy_name, table_name):
+    """Count the rows in a policy's data table, given by name.
 
+    The response is streamed and its rows are only decoded to be counted,
+    so no row objects are built and memory use doesn't depend on the size
+    of the table.
+    """
+    return count_policy_rows(congressclient(request), policy_name, table_name)
 
+
+def count_policy_rows(client, policy_name, table_name):
+    """Count the rows in a policy's data table with the given client."""
+    path = congress_client.Client.policy_rows % (policy_name, table_name)
+    return sum(1 for _ in _iter_results(client, path))
+
+
+def datasource_rows_iter(request, datasource_id, table_name):
+    """Yield the values of each row in a data source's table, as received."""
+    path = congress_client.Client.datasource_rows % (datasource_id,
+                                                     table_name)
+    for row in _iter_results(congressclient(request), path):
+        yield row.get('data', [])
+
+
+def policy_rows_page(request, policy_name, table_name, marker=None,
+                     limit=20, reverse=False):
+    """Get a page of rows in a policy's data table, given by name."""
+    return _get_rows_page(
+        request, lambda: policy_rows_list(request, policy_name, table_name),
+        ('policy', policy_name, table_name), marker, limit, reverse)
+
+
+def datasource_rows_page(request, datasource_id, table_name, marker=None,
+                         limit=20, reverse=False):
+    """Get a page of rows in a data source's data table, given by id."""
+    return _get_rows_page(
+        request,
+        lambda: datasource_rows_list(request, datasource_id, table_name),
+        ('datasource', datasource_id, table_name), marker, limit, reverse)
+
+
+@cache.memoized_per_request
+@cache.shared('datasource_schemas', subject=0)
 def datasource_schema_get(request, datasource_id):
     """Get the schema for all tables in the given data source."""
     client = congressclient(request)
     return client.show_datasource_schema(datasource_id)
 
 
+@cache.memoized_per_request
+@cache.shared('datasource_schemas', subject=0)
 def datasource_table_schema_get(request, datasource_id, table_name):
     """Get the schema for a data source table."""
     client = congressclient(request)
     return client.show_datasource_table_schema(datasource_id, table_name)
 
 
+@cache.memoized_per_request
+@cache.shared('datasource_schemas', subject=0)
 def datasource_table_schema_get_by_name(request, datasource_name, table_name):
     """Get the schema for a data source table."""
     datasource = datasource_get_by_name(request, datasource_name)
@@ -303,27 +1051,35 @@ def datasource_table_schema_get_by_name(request, datasource_name, table_name):
     return client.show_datasource_table_schema(datasource['id'], table_name)
 
 
+@cache.memoized_per_request
 def datasource_statuses_list(request):
+    """List the status of every data source.
+
+    Statuses are fetched concurrently. A data source whose status can't be
+    retrieved is still listed, with the error as its last error.
+    """
+    datasources = datasources_list(request)
     client = congressclient(request)
-    datasources_list = client.list_datasources()
-    datasources = datasources_list['results']
-    ds_status = []
 
-    for ds in datasources:
-        try:
-            status = client.list_datasource_status(ds['id'])
-        except Exception:
-            LOG.exception("Exception while getting the status")
-            raise
-        wrapper = PolicyAPIDictWrapper(ds)
-        wrapper.set_value('service', ds['name'])
-        for key in status:
-            value = status[key]
-            wrapper.set_value(key, value)
-        ds_status.append(wrapper)
+    def get_status(ds):
+        return client.list_datasource_status(ds['id'])
+
+    outcomes = concurrency.map_isolated(get_status, datasources)
+    ds_status = []
+    for ds, outcome in zip(datasources, outcomes):
+        ds.set_value('service', ds['name'])
+        if outcome.error is not None:
+            LOG.error('Unable to get the status of data source "%s": %s',
+                      ds['name'], outcome.error)
+            ds.set_value('last_error', str(outcome.error))
+        else:
+            for key, value in outcome.value.items():
+                ds.set_value(key, value)
+        ds_status.append(ds)
     return ds_status
 
 
+@cache.memoized_per_request
 def datasource_status_list(request, datasource_name):
     client = congressclient(request)
     try:
@@ -335,6 +1091,8 @@ def datasource_status_list(request, datasource_name):
         raise
 
 
+@cache.memoized_per_request
+@cache.shared('drivers')
 def supported_driver_list(request):
     client = congressclient(request)
     try:
@@ -346,21 +1104,29 @@ def supported_driver_list(request):
         raise
 
 
+@cache.invalidates(('datasources', None), ('rule_catalog', None))
 def create_datasource(request, data):
     client = congressclient(request)
     datasource = client.create_datasource(data)
     return datasource
 
 
+@cache.invalidates(('datasources', None), ('rule_catalog', None))
 def delete_datasource(request, datasource_name):
+    subjects = _get_aliases(datasources_index, request, datasource_name)
     client = congressclient(request)
     try:
         client.delete_datasource(datasource_name)
     except Exception:
         LOG.exception("deleting datasource %s failed", datasource_name)
         raise
+    finally:
+        for subject in subjects:
+            cache.invalidate(request, 'datasource_tables', subject)
+            cache.invalidate(request, 'datasource_schemas', subject)
 
 
+@cache.memoized_per_request
 def list_policies_from_library(request, include_rules=True):
     client = congressclient(request)
     try:
@@ -375,6 +1141,7 @@ def list_policies_from_library(request, include_rules=True):
         raise
 
 
+@cache.memoized_per_request
 def show_library_policy(request, name, include_rules=True):
     client = congressclient(request)
     try:
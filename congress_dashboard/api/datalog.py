@@ -0,0 +1,316 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Tokenizer and parser for the Datalog dialect used by Congress rules.
+
+This is not a validator: Congress remains the authority on what is a legal
+rule. It only recovers enough structure (heads, body literals, negations,
+modals and arguments) for the dashboard to display rules and derive table
+schemas without splitting strings by hand.
+"""
+
+import collections
+import functools
+import re
+
+
+RULE_SEPARATOR = ':-'
+NEGATION = 'not'
+
+# Number of distinct rule texts whose parse results are kept.
+PARSE_CACHE_SIZE = 4096
+
+Token = collections.namedtuple('Token', ['kind', 'value', 'start', 'end'])
+
+# A rule of a multi-rule text, with its annotations and first line number.
+RuleEntry = collections.namedtuple('RuleEntry',
+                                   ['rule', 'name', 'comment', 'line'])
+
+# Optional terminator after each rule of a multi-rule text.
+RULE_TERMINATOR = '.'
+
+# Comment lines annotating the rule which follows them, e.g. '# name: foo'.
+_ANNOTATION_RE = re.compile(
+    r'^[ \t]*(?://|#)[ \t]*(name|comment)[ \t]*:[ \t]*(.*?)[ \t]*$',
+    re.MULTILINE)
+
+_TOKEN_PATTERNS = (
+    ('comment', r'(?://|#)[^\n]*'),
+    ('space', r'\s+'),
+    ('string', r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''),
+    ('number', r'-?\d+(?:\.\d+)?'),
+    ('separator', re.escape(RULE_SEPARATOR)),
+    # Dots only join the segments of a name, so that a rule's terminator
+    # isn't taken as part of a last, zero-arity literal.
+    ('name', r'[A-Za-z_][\w\-]*(?:\.[A-Za-z_][\w\-]*)*'
+             r'(?::[A-Za-z_][\w\-]*(?:\.[A-Za-z_][\w\-]*)*)*'),
+    ('punct', r'[()\[\],]'),
+    ('operator', r'[^\s\w"\'()\[\],]+'),
+)
+_TOKEN_RE = re.compile('|'.join('(?P<%s>%s)' % p for p in _TOKEN_PATTERNS))
+
+
+class DatalogSyntaxError(ValueError):
+    """The text could not be parsed as Datalog rules."""
+
+    def __init__(self, message, offset=None):
+        super(DatalogSyntaxError, self).__init__(message)
+        self.offset = offset
+
+
+class Literal(collections.namedtuple(
+        'Literal', ['table', 'arguments', 'negated', 'modal', 'text'])):
+    """A literal such as 'not nova:servers(id=x, name)'.
+
+    'arguments' holds the source text of each argument, 'modal' the name of
+    an enclosing modal operator such as 'execute', and 'text' the source text
+    of the whole literal.
+    """
+
+    __slots__ = ()
+
+    @property
+    def arity(self):
+        return len(self.arguments)
+
+    @property
+    def theory(self):
+        """The data source or policy prefix of the table, if any."""
+        if ':' in self.table:
+            return self.table.split(':', 1)[0]
+        return None
+
+
+class Rule(collections.namedtuple('Rule', ['heads', 'body', 'text'])):
+    """A rule, or a fact when its body is empty."""
+
+    __slots__ = ()
+
+    @property
+    def head(self):
+        return self.heads[0]
+
+    @property
+    def negations(self):
+        return tuple(lit for lit in self.body if lit.negated)
+
+
+def tokenize(text, comments=False):
+    """Split text into tokens, dropping whitespace.
+
+    Comments are dropped too unless comments is True.
+    """
+    tokens = []
+    pos = 0
+    length = len(text)
+    while pos < length:
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise DatalogSyntaxError('Unexpected character %r at offset %d' %
+                                     (text[pos], pos), pos)
+        kind = match.lastgroup
+        if kind != 'space' and (comments or kind != 'comment'):
+            tokens.append(Token(kind, match.group(), pos, match.end()))
+        pos = match.end()
+    return tokens
+
+
+class _Parser(object):
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise DatalogSyntaxError('Unexpected end of rule',
+                                     len(self.text))
+        self.pos += 1
+        return token
+
+    def expect(self, value):
+        token = self.next()
+        if token.value != value:
+            raise DatalogSyntaxError('Expected "%s" at offset %d, found "%s"'
+                                     % (value, token.start, token.value),
+                                     token.start)
+        return token
+
+    def at_end(self):
+        return self.peek() is None
+
+    def parse_rule(self):
+        start = self.peek()
+        heads = self.parse_literals()
+        body = ()
+        token = self.peek()
+        if token is not None and token.kind == 'separator':
+            self.next()
+            body = self.parse_literals()
+        end = self.tokens[self.pos - 1]
+        return Rule(heads, body, self.text[start.start:end.end])
+
+    def parse_literals(self):
+        literals = [self.parse_literal()]
+        while True:
+            token = self.peek()
+            if token is None or token.value != ',':
+                return tuple(literals)
+            self.next()
+            literals.append(self.parse_literal())
+
+    def parse_literal(self):
+        start = self.peek()
+        negated = False
+        if (start is not None and start.value == NEGATION and
+                self.pos + 1 < len(self.tokens) and
+                self.tokens[self.pos + 1].kind == 'name'):
+            self.next()
+            negated = True
+
+        name = self.next()
+        if name.kind != 'name':
+            raise DatalogSyntaxError('Expected a table name at offset %d, '
+                                     'found "%s"' % (name.start, name.value),
+                                     name.start)
+        modal = None
+        token = self.peek()
+        if token is not None and token.value == '[':
+            # Modal operator, as in execute[nova:servers.pause(x)].
+            self.next()
+            inner = self.parse_literal()
+            self.expect(']')
+            end = self.tokens[self.pos - 1]
+            return Literal(inner.table, inner.arguments, negated, name.value,
+                           self.text[start.start:end.end])
+
+        arguments = ()
+        if token is not None and token.value == '(':
+            arguments = self.parse_arguments()
+        end = self.tokens[self.pos - 1]
+        return Literal(name.value, arguments, negated, modal,
+                       self.text[start.start:end.end])
+
+    def parse_arguments(self):
+        self.expect('(')
+        arguments = []
+        first = None
+        last = None
+        depth = 0
+        while True:
+            token = self.next()
+            if depth == 0 and token.value in (',', ')'):
+                if first is not None:
+                    arguments.append(self.text[first.start:last.end])
+                elif token.value == ',' or arguments:
+                    raise DatalogSyntaxError('Empty argument at offset %d' %
+                                             token.start, token.start)
+                if token.value == ')':
+                    return tuple(arguments)
+                first = last = None
+                continue
+            if token.value in ('(', '['):
+                depth += 1
+            elif token.value in (')', ']'):
+                depth -= 1
+            if first is None:
+                first = token
+            last = token
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_rule(text):
+    """Parse the text of a single rule.
+
+    Results are immutable and memoized by rule text, so callers rendering
+    the same rules over and over only pay for parsing once.
+    """
+    parser = _Parser(text)
+    if parser.at_end():
+        raise DatalogSyntaxError('Empty rule', 0)
+    rule = parser.parse_rule()
+    if not parser.at_end():
+        token = parser.peek()
+        raise DatalogSyntaxError('Unexpected "%s" at offset %d' %
+                                 (token.value, token.start), token.start)
+    return rule
+
+
+def _line_of(text, offset):
+    return text.count('\n', 0, offset) + 1
+
+
+def parse_rules(text):
+    """Parse a text holding any number of rules.
+
+    Rules follow each other, each optionally terminated by a '.'. Comment
+    lines such as '# name: ...' and '# comment: ...' before a rule set its
+    name and comment. Returns a RuleEntry for each rule, in order, whose
+    rule is the source text of the rule. A DatalogSyntaxError names the
+    line of the first error.
+    """
+    annotations = [(m.start(), m.group(1), m.group(2))
+                   for m in _ANNOTATION_RE.finditer(text)]
+    try:
+        parser = _Parser(text)
+    except DatalogSyntaxError as e:
+        raise DatalogSyntaxError('Line %d: %s' % (
+            _line_of(text, e.offset or 0), e), e.offset)
+
+    entries = []
+    previous_end = 0
+    while not parser.at_end():
+        start = parser.peek().start
+        try:
+            rule = parser.parse_rule()
+        except DatalogSyntaxError as e:
+            raise DatalogSyntaxError('Line %d: %s' % (
+                _line_of(text, e.offset or 0), e), e.offset)
+        token = parser.peek()
+        if token is not None and token.value == RULE_TERMINATOR:
+            parser.next()
+
+        name = comment = ''
+        for offset, key, value in annotations:
+            if previous_end <= offset < start:
+                if key == 'name':
+                    name = value
+                else:
+                    comment = value
+        previous_end = parser.tokens[parser.pos - 1].end
+        entries.append(RuleEntry(rule.text, name, comment,
+                                 _line_of(text, start)))
+    return entries
+
+
+def build_literal(table, arguments=(), negated=False):
+    """Return the text of a literal, e.g. 'not nova:servers(x, y)'."""
+    text = table
+    if arguments:
+        text = '%s(%s)' % (table, ', '.join(arguments))
+    if negated:
+        text = '%s %s' % (NEGATION, text)
+    return text
+
+
+def build_rule(head, body=()):
+    """Return the text of a rule from the text of its literals."""
+    if not body:
+        return head
+    return '%s %s %s' % (head, RULE_SEPARATOR, ', '.join(body))
@@ -0,0 +1,147 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import logging
+
+from django import shortcuts
+from django.utils.translation import ugettext_lazy as _
+from horizon import exceptions
+from horizon import messages
+
+from congress_dashboard.api import cache
+from congress_dashboard.api import concurrency
+
+
+LOG = logging.getLogger(__name__)
+
+
+class ConcurrentBatchMixin(object):
+    """Run a table batch action on the selected objects concurrently.
+
+    Mixed into a BatchAction or DeleteAction, it replaces the serial handle()
+    of horizon with one calling action() for every allowed object through
+    the bounded executor. Each failure is reported with its reason, and
+    cached reads are invalidated once the whole batch is done.
+    """
+
+    def exclude(self, request, selected):
+        """Return (obj_id, reason) for selected objects not to act on.
+
+        'selected' is a list of (obj_id, datum, display) tuples.
+        """
+        return []
+
+    def _handle_error(self, request, display, error):
+        """Let horizon handle an error raised while acting on an object.
+
+        Errors are raised in worker threads, so they are handled here, in
+        the request's thread, once the whole batch is done. An unauthorized
+        error, such as an expired token, ends the request instead of being
+        reported once per object.
+        """
+        msg = _('Unable to %(action)s "%(name)s"') % {
+            'action': self._get_action_name([display]).lower(),
+            'name': display}
+        try:
+            raise error
+        except Exception:
+            result = exceptions.handle(request, msg, ignore=True)
+        if result is exceptions.NotAuthorized:
+            raise exceptions.NotAuthorized
+
+    def handle(self, table, request, obj_ids):
+        selected = []
+        not_allowed = []
+        for obj_id in obj_ids:
+            datum = table.get_object_by_id(obj_id)
+            display = table.get_object_display(datum) or obj_id
+            if not table._filter_action(self, request, datum):
+                not_allowed.append(display)
+                continue
+            selected.append((obj_id, datum, display))
+
+        excluded = dict(self.exclude(request, selected))
+        failures = [(display, excluded[obj_id])
+                    for obj_id, datum, display in selected
+                    if obj_id in excluded]
+        selected = [(obj_id, datum, display)
+                    for obj_id, datum, display in selected
+                    if obj_id not in excluded]
+
+        def act(obj_id):
+            self.action(request, obj_id)
+
+        with cache.deferred_invalidation(request):
+            outcomes = concurrency.map_isolated(
+                act, [obj_id for obj_id, datum, display in selected])
+
+        succeeded = []
+        for (obj_id, datum, display), outcome in zip(selected, outcomes):
+            error = outcome.error
+            if error is None:
+                self.update(request, datum)
+                succeeded.append(display)
+                self.success_ids.append(obj_id)
+                continue
+            if isinstance(error, exceptions.HandledException):
+                error = error.wrapped[1]
+            else:
+                self._handle_error(request, display, error)
+            LOG.warning('Unable to %s "%s": %s',
+                        self._get_action_name([display]).lower(), display,
+                        error)
+            failures.append((display, error))
+
+        success_message = getattr(messages, self.default_message_level)
+        if not_allowed:
+            msg = _('You are not allowed to %(action)s: %(objs)s')
+            params = {'action':
+                      self._get_action_name(not_allowed).lower(),
+                      'objs': ', '.join(not_allowed)}
+            messages.error(request, msg % params)
+            success_message = messages.info
+        for display, error in failures:
+            msg_args = {'action': self._get_action_name([display]).lower(),
+                        'name': display, 'error': str(error)}
+            msg = _('Unable to %(action)s "%(name)s": %(error)s') % msg_args
+            messages.error(request, msg)
+            success_message = messages.info
+        if succeeded:
+            msg = _('%(action)s: %(objs)s')
+            params = {'action':
+                      self._get_action_name(succeeded, past=True),
+                      'objs': ', '.join(succeeded)}
+            success_message(request, msg % params)
+        return shortcuts.redirect(self.get_success_url(request))
+
+
+class PositionPagedTableMixin(object):
+    """Page a table by the positions of its rows rather than their ids.
+
+    For tables whose data has an 'offset' attribute, the position of its
+    first row in the whole sequence, such as TableRows slices. Use this
+    when ids may be duplicated or unordered, and get the bounds of each
+    page from congress.get_page_bounds().
+    """
+
+    def get_prev_marker(self):
+        offset = getattr(self.data, 'offset', None)
+        if offset is None:
+            return super(PositionPagedTableMixin, self).get_prev_marker()
+        return str(offset)
+
+    def get_marker(self):
+        offset = getattr(self.data, 'offset', None)
+        if offset is None:
+            return super(PositionPagedTableMixin, self).get_marker()
+        return str(offset + len(self.data) - 1)
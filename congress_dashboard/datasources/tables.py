@@ -14,11 +14,13 @@
 
 from django.template.defaultfilters import unordered_list
 from django.urls import reverse
+from django.utils.http import urlencode
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ungettext_lazy
 from horizon import tables
 
 from congress_dashboard.api import congress
+from congress_dashboard.common import tables as common_tables
 
 
 def get_resource_url(obj):
@@ -36,11 +38,41 @@ class DataSourcesTablesTable(tables.DataTable):
         hidden_title = False
 
 
-class DataSourceRowsTable(tables.DataTable):
+class ExportRows(tables.LinkAction):
+    name = 'export_csv'
+    verbose_name = _('Export CSV')
+    icon = 'download'
+    export_format = 'csv'
+
+    def get_link_url(self, datum=None):
+        kwargs = self.table.kwargs
+        if 'policy_table_name' in kwargs:
+            url = reverse('horizon:admin:policies:policy_table_export',
+                          args=(kwargs['datasource_id'],
+                                kwargs['policy_table_name']))
+        else:
+            url = reverse('horizon:admin:datasources:datasource_table_export',
+                          args=(kwargs['datasource_id'],
+                                kwargs['service_table_name']))
+        return '%s?%s' % (url, urlencode({'format': self.export_format}))
+
+
+class ExportRowsJSON(ExportRows):
+    name = 'export_json'
+    verbose_name = _('Export JSON')
+    export_format = 'json'
+
+
+class DataSourceRowsTable(common_tables.PositionPagedTableMixin,
+                          tables.DataTable):
+    # Rows are paged by position, since their ids may come from the data and
+    # need not be unique or ordered.
+
     class Meta(object):
         name = "datasource_rows"
         verbose_name = _("Rows")
         hidden_title = False
+        table_actions = (ExportRows, ExportRowsJSON)
 
 
 class CreateDatasource(tables.LinkAction):
@@ -51,7 +83,8 @@ class CreateDatasource(tables.LinkAction):
     icon = 'plus'
 
 
-class DeleteDatasource(tables.DeleteAction):
+class DeleteDatasource(common_tables.ConcurrentBatchMixin,
+                       tables.DeleteAction):
     @staticmethod
     def action_present(count):
         return ungettext_lazy(
@@ -68,8 +101,6 @@ class DeleteDatasource(tables.DeleteAction):
             count
         )
 
-    redirect_url = 'horizon:admin:datasources:index'
-
     def delete(self, request, name):
         congress.delete_datasource(request, name)
 
@@ -27,6 +27,8 @@ urlpatterns = [
     url(r'^create/$', views.CreateView.as_view(), name='create'),
     url(SERVICES % 'detail', views.DetailView.as_view(),
         name='datasource_table_detail'),
+    url(SERVICES % 'export', views.ExportView.as_view(),
+        name='datasource_table_export'),
     url(DATASOURCE % 'detail', views.DatasourceView.as_view(),
         name='datasource_detail'),
 
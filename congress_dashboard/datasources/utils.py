@@ -12,13 +12,30 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import bisect
+import hashlib
+import json
 import logging
 
+from django.template.defaultfilters import dictsort
+
+from congress_dashboard.api import cache
+from congress_dashboard.api import concurrency
 from congress_dashboard.api import congress
 
 
 LOG = logging.getLogger(__name__)
 
+# Policy tables whose rows are violations.
+VIOLATIONS_TABLES = ('error', 'warning')
+
+# Number of catalog versions whose prefix indexes are kept.
+CATALOG_INDEX_CACHE_SIZE = 8
+# Characters after which a word of a catalog entry starts.
+CATALOG_WORD_SEPARATORS = (congress.TABLE_SEPARATOR, ' ')
+
+_catalog_indexes = cache.LRU(CATALOG_INDEX_CACHE_SIZE)
+
 
 def _get_policy_tables(request):
     # Return all policy tables.
@@ -28,78 +45,91 @@ def _get_policy_tables(request):
         policies = congress.policies_list(request)
     except Exception as e:
         LOG.error('Unable to get list of policies: %s', str(e))
-    else:
-        try:
-            for policy in policies:
-                # Get all the tables in this policy.
-                policy_name = policy['name']
-                policy_tables = congress.policy_tables_list(request,
-                                                            policy_name)
-                # Get the names of the tables.
-                datasource_tables = []
-                for table in policy_tables:
-                    table.set_id_as_name_if_empty()
-                    table_name = table['name']
-                    # Exclude service-derived tables.
-                    if congress.TABLE_SEPARATOR not in table_name:
-                        datasource_tables.append(table['name'])
-
-                all_tables.append({'datasource': policy_name,
-                                   'tables': datasource_tables})
-        except Exception as e:
+        return all_tables
+
+    def get_tables(policy):
+        # Get all the tables in this policy.
+        return congress.policy_tables_list(request, policy['name'])
+
+    outcomes = concurrency.map_isolated(get_tables, policies)
+    for policy, outcome in zip(policies, outcomes):
+        policy_name = policy['name']
+        if outcome.error is not None:
             LOG.error('Unable to get tables for policy "%s": %s',
-                      policy_name, str(e))
+                      policy_name, str(outcome.error))
+            continue
+
+        # Get the names of the tables.
+        datasource_tables = []
+        for table in outcome.value:
+            table.set_id_as_name_if_empty()
+            table_name = table['name']
+            # Exclude service-derived tables.
+            if congress.TABLE_SEPARATOR not in table_name:
+                datasource_tables.append(table['name'])
+
+        all_tables.append({'datasource': policy_name,
+                           'tables': datasource_tables})
     return all_tables
 
 
 def _get_policy_violations_tables(request):
     """Return error and warning tables info for all policies. """
+    tables_data = []
     try:
         # Get all the policies.
         policies = congress.policies_list(request)
     except Exception as e:
         LOG.error('Unable to get list of policies: %s', str(e))
-    else:
-        try:
-            tables_data = []
-            for policy in policies:
-                policy_name = policy['name']
-                policy_table_info = {}
-                error_warning_tables = []
-                # Get all the tables in this policy.
-                policy_tables = congress.policy_tables_list(request,
-                                                            policy_name)
-                for table in policy_tables:
-                    table_name = table['id']
-                    if congress.TABLE_SEPARATOR in table_name:
-                        continue
-                    if table_name == 'error' or table_name == 'warning':
-                        policy_table_info['policy'] = policy
-                        error_warning_tables.append(table_name)
-                if error_warning_tables:
-                    policy_table_info['tables'] = error_warning_tables
-                    tables_data.append(policy_table_info)
-        except Exception as e:
+        return tables_data
+
+    def get_violations_tables(policy):
+        # The tables of each policy are cached, so policies without error
+        # or warning tables are skipped without fetching any rows.
+        policy_tables = congress.policy_tables_list(request, policy['name'])
+        table_names = set(table['id'] for table in policy_tables)
+        return [t for t in VIOLATIONS_TABLES if t in table_names]
+
+    outcomes = concurrency.map_isolated(get_violations_tables, policies)
+    for policy, outcome in zip(policies, outcomes):
+        if outcome.error is not None:
             LOG.error('Unable to get tables for policy "%s": %s',
-                      policy_name, str(e))
+                      policy['name'], str(outcome.error))
+            continue
+        if outcome.value:
+            tables_data.append({'policy': policy, 'tables': outcome.value})
     return tables_data
 
 
 def get_policy_violations_data(request):
     """Get the row count of each error and warning tables. """
     tables_data = _get_policy_violations_tables(request)
-    violations_table = []
+    violations_tables = [(data['policy']['name'], t)
+                         for data in tables_data for t in data['tables']]
 
+    def count_rows(policy_table):
+        return congress.policy_rows_count(request, *policy_table)
+
+    outcomes = concurrency.map_isolated(count_rows, violations_tables)
+    counts = {}
+    for policy_table, outcome in zip(violations_tables, outcomes):
+        if outcome.error is not None:
+            LOG.error('Unable to count rows in table "%s" of policy "%s": '
+                      '%s', policy_table[1], policy_table[0],
+                      str(outcome.error))
+            continue
+        counts[policy_table] = outcome.value
+
+    violations_table = []
     for data in tables_data:
         policy = data['policy']
-        tables = data['tables']
         row = congress.PolicyTable({"id": policy['name']})
         row.set_id_as_name_if_empty()
         row.set_policy_details(policy)
-        for t in tables:
-            rows = congress.policy_rows_list(request, policy['name'], t)
-            if len(rows) > 0:
-                row.set_value(t, len(rows))
+        for t in data['tables']:
+            count = counts.get((policy['name'], t), 0)
+            if count > 0:
+                row.set_value(t, count)
         if row.get('error') or row.get('warning'):
             violations_table.append(row)
     return violations_table
@@ -113,24 +143,27 @@ def _get_service_tables(request):
         services = congress.datasources_list(request)
     except Exception as e:
         LOG.error('Unable to get list of data sources: %s', str(e))
-    else:
-        try:
-            for service in services:
-                # Get all the tables in this service.
-                service_id = service['id']
-                service_tables = congress.datasource_tables_list(request,
-                                                                 service_id)
-                # Get the names of the tables.
-                datasource_tables = []
-                for table in service_tables:
-                    table.set_id_as_name_if_empty()
-                    datasource_tables.append(table['name'])
-
-                all_tables.append({'datasource': service['name'],
-                                   'tables': datasource_tables})
-        except Exception as e:
+        return all_tables
+
+    def get_tables(service):
+        # Get all the tables in this service.
+        return congress.datasource_tables_list(request, service['id'])
+
+    outcomes = concurrency.map_isolated(get_tables, services)
+    for service, outcome in zip(services, outcomes):
+        if outcome.error is not None:
             LOG.error('Unable to get tables for data source "%s": %s',
-                      service_id, str(e))
+                      service['id'], str(outcome.error))
+            continue
+
+        # Get the names of the tables.
+        datasource_tables = []
+        for table in outcome.value:
+            table.set_id_as_name_if_empty()
+            datasource_tables.append(table['name'])
+
+        all_tables.append({'datasource': service['name'],
+                           'tables': datasource_tables})
     return all_tables
 
 
@@ -187,54 +220,162 @@ def get_datasource_columns(request):
 
     # Get all the policy tables.
     policy_tables = _get_policy_tables(request)
-    try:
-        for policy in policy_tables:
-            # Get all the columns in this policy. Unlike for the services,
-            # there's currently no congress client API to get the schema for
-            # all tables in a policy in a single call.
-            policy_name = policy['datasource']
-            tables = policy['tables']
-
-            datasource_tables = []
-            for table_name in tables:
-                # Get all the columns in this policy table.
-                schema = congress.policy_table_schema_get(request, policy_name,
-                                                          table_name)
-                columns = [c['name'] for c in schema['columns']]
-                datasource_tables.append({'table': table_name,
-                                          'columns': columns})
-
-            all_columns.append({'datasource': policy_name,
-                                'tables': datasource_tables})
-    except Exception as e:
-        LOG.error('Unable to get schema for policy "%s" table "%s": %s',
-                  policy_name, table_name, str(e))
+
+    def get_policy_columns(policy):
+        # Get all the columns in this policy. Unlike for the services,
+        # there's currently no congress client API to get the schema for
+        # all tables in a policy, so derive them all from its rules at once.
+        schemas = congress.policy_table_schemas_get(request,
+                                                    policy['datasource'])
+        datasource_tables = []
+        for table_name in policy['tables']:
+            # Get all the columns in this policy table.
+            schema = schemas.get(table_name, {'columns': []})
+            columns = [c['name'] for c in schema['columns']]
+            datasource_tables.append({'table': table_name,
+                                      'columns': columns})
+        return datasource_tables
+
+    outcomes = concurrency.map_isolated(get_policy_columns, policy_tables)
+    for policy, outcome in zip(policy_tables, outcomes):
+        if outcome.error is not None:
+            LOG.error('Unable to get schema for policy "%s": %s',
+                      policy['datasource'], str(outcome.error))
+            continue
+        all_columns.append({'datasource': policy['datasource'],
+                            'tables': outcome.value})
 
     try:
         # Get all the services.
         services = congress.datasources_list(request)
     except Exception as e:
         LOG.error('Unable to get list of data sources: %s', str(e))
-    else:
-        try:
-            for service in services:
-                # Get the schema for this service.
-                service_id = service['id']
-                service_name = service['name']
-                schema = congress.datasource_schema_get(request, service_id)
-
-                datasource_tables = []
-                for table in schema['tables']:
-                    # Get the columns for this table.
-                    columns = [c['name'] for c in table['columns']]
-                    datasource_table = {'table': table['table_id'],
-                                        'columns': columns}
-                    datasource_tables.append(datasource_table)
-
-                all_columns.append({'datasource': service_name,
-                                    'tables': datasource_tables})
-        except Exception as e:
+        return all_columns
+
+    def get_service_schema(service):
+        # Get the schema for this service.
+        return congress.datasource_schema_get(request, service['id'])
+
+    outcomes = concurrency.map_isolated(get_service_schema, services)
+    for service, outcome in zip(services, outcomes):
+        if outcome.error is not None:
             LOG.error('Unable to get schema for data source "%s": %s',
-                      service_id, str(e))
+                      service['id'], str(outcome.error))
+            continue
+
+        datasource_tables = []
+        for table in outcome.value['tables']:
+            # Get the columns for this table.
+            columns = [c['name'] for c in table['columns']]
+            datasource_table = {'table': table['table_id'],
+                                'columns': columns}
+            datasource_tables.append(datasource_table)
+
+        all_columns.append({'datasource': service['name'],
+                            'tables': datasource_tables})
 
     return all_columns
+
+
+@cache.shared('rule_catalog', local=True)
+def get_rule_catalog(request):
+    """Get the tables and columns offered when constructing a rule.
+
+    Returns a dict with the sorted 'tables', as 'datasource:table', the
+    sorted 'columns', as 'datasource:table column', and a 'version' which
+    changes whenever either of them does. The catalog is kept in process
+    when the shared cache is disabled, since looking up the catalog's
+    version must not cost a listing of every policy and data source. It
+    isn't memoized per request, which would copy it, so callers must not
+    modify it.
+    """
+    all_tables = get_datasource_tables(request)
+    sorted_datasources = dictsort(all_tables, 'datasource')
+    tables = []
+    for ds in sorted_datasources:
+        for table in sorted(ds['tables']):
+            tables.append('%s%s%s' % (ds['datasource'],
+                                      congress.TABLE_SEPARATOR, table))
+
+    datasource_columns = get_datasource_columns(request)
+    sorted_datasources = dictsort(datasource_columns, 'datasource')
+    columns = []
+    for ds in sorted_datasources:
+        sorted_tables = dictsort(ds['tables'], 'table')
+        for tbl in sorted_tables:
+            # Ignore service-derived tables, which are already included.
+            if congress.TABLE_SEPARATOR in tbl['table']:
+                continue
+            table_columns = tbl['columns']
+            if table_columns:
+                table_columns = sorted(table_columns)
+            else:
+                # Placeholder name for column when the table has none.
+                table_columns = ['_']
+
+            for column in table_columns:
+                columns.append('%s%s%s %s' % (ds['datasource'],
+                                              congress.TABLE_SEPARATOR,
+                                              tbl['table'], column))
+
+    version = hashlib.sha1(json.dumps([tables, columns]).encode('utf-8'))
+    return {'version': version.hexdigest(), 'tables': tables,
+            'columns': columns}
+
+
+class PrefixIndex(object):
+    """Case-insensitive prefix search over a list of entries.
+
+    Each entry is indexed under its whole text and under every word of it,
+    so that 'serv' finds 'nova:servers id'. Keys are kept in a sorted list,
+    where the keys starting with a prefix are found by bisection.
+    """
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        keys = []
+        for position, entry in enumerate(self.entries):
+            text = entry.lower()
+            keys.append((text, position))
+            for i, char in enumerate(text):
+                if char in CATALOG_WORD_SEPARATORS and i + 1 < len(text):
+                    keys.append((text[i + 1:], position))
+        keys.sort()
+        self._keys = [key for key, position in keys]
+        self._positions = [position for key, position in keys]
+
+    def search(self, prefix, limit=None):
+        """Return the entries matching the prefix, in their original order.
+
+        Entries whose whole text starts with the prefix come first.
+        """
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + '\uffff', start)
+        whole = []
+        words = set()
+        for i in range(start, end):
+            position = self._positions[i]
+            if self.entries[position].lower().startswith(prefix):
+                whole.append(position)
+            else:
+                words.add(position)
+        positions = sorted(set(whole))
+        positions.extend(sorted(words.difference(positions)))
+        if limit is not None:
+            positions = positions[:limit]
+        return [self.entries[position] for position in positions]
+
+
+def get_catalog_index(request, kind):
+    """Get the prefix index of the rule catalog's 'tables' or 'columns'.
+
+    Indexes are built once per catalog version and kept in process.
+    """
+    catalog = get_rule_catalog(request)
+    key = (catalog['version'], kind)
+    index = _catalog_indexes.get(key)
+    if index is None:
+        index = PrefixIndex(catalog[kind])
+        _catalog_indexes.put(key, index)
+    return catalog['version'], index
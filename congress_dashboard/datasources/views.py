@@ -13,17 +13,25 @@
 # under the License.
 
 import copy
+import csv
+import json
 import logging
+import zlib
 
+from django.conf import settings
+from django import http
 from django.template.defaultfilters import slugify
 from django.urls import reverse
 from django.urls import reverse_lazy
 from django.utils.translation import ugettext_lazy as _
+from django.views import generic
 from horizon import exceptions
 from horizon import forms
 from horizon import messages
 from horizon import tables
+from horizon.utils import functions as utils
 
+from congress_dashboard.api import cache
 from congress_dashboard.api import congress
 from congress_dashboard.datasources import forms as datasource_forms
 from congress_dashboard.datasources import tables as datasources_tables
@@ -31,6 +39,45 @@ from congress_dashboard.datasources import tables as datasources_tables
 
 logger = logging.getLogger(__name__)
 
+# Number of table classes with data source specific columns that are kept.
+TABLE_CLASS_CACHE_SIZE = 256
+
+_table_classes = cache.LRU(TABLE_CLASS_CACHE_SIZE)
+
+
+def _get_columnized_table_class(table_class, datasource_id, table_name,
+                                columns):
+    """Get a copy of a table class, with the given columns added to it.
+
+    Classes are cached per data source table, since running the metaclass is
+    costly and schemas rarely change. A cached class is replaced as soon as
+    the columns of its table change.
+    """
+    key = (table_class, datasource_id, table_name)
+    cached = _table_classes.get(key)
+    if cached is not None and cached[0] == columns:
+        return cached[1]
+
+    # The metaclass instantiates the actions again from Meta, and action
+    # instances can't always be deep copied.
+    table_class_attrs = copy.deepcopy(dict(
+        (name, value) for name, value in table_class.__dict__.items()
+        if name != 'base_actions'))
+    for name, verbose_name in columns:
+        table_class_attrs[name] = tables.Column(name,
+                                                verbose_name=verbose_name)
+
+    # Class re-creation, using a new class name, the same base classes, and
+    # the new class attributes, which now includes columns.
+    columnized_table_class_name = '%s%sRows' % (
+        slugify(datasource_id).title(), slugify(table_name).title())
+    columnized_table_class = tables.base.DataTableMetaclass(
+        str(columnized_table_class_name), table_class.__bases__,
+        table_class_attrs)
+
+    _table_classes.put(key, (columns, columnized_table_class))
+    return columnized_table_class
+
 
 class IndexView(tables.MultiTableView):
     """List service and policy defined data."""
@@ -116,40 +163,52 @@ class CreateView(forms.ModalFormView):
     success_url = reverse_lazy('horizon:admin:datasources:index')
 
 
-class DetailView(tables.DataTableView):
+class DetailView(tables.PagedTableMixin, tables.DataTableView):
     """List details about and rows from a data source (service or policy)."""
     table_class = datasources_tables.DataSourceRowsTable
     template_name = 'admin/datasources/detail.html'
 
+    def _get_page_size(self):
+        page_size = getattr(settings, 'CONGRESS_ROWS_PAGE_SIZE', None)
+        return page_size or utils.get_page_size(self.request)
+
     def get_data(self):
         datasource_id = self.kwargs['datasource_id']
         table_name = self.kwargs.get('policy_table_name')
         is_service = False
+        marker, sort_dir = self._get_marker()
+        page = {
+            'marker': marker,
+            'limit': self._get_page_size(),
+            'reverse': sort_dir == 'asc',
+        }
         try:
             if table_name:
                 # Policy data table.
-                rows = congress.policy_rows_list(self.request, datasource_id,
-                                                 table_name)
+                rows, self._has_prev_data, self._has_more_data = (
+                    congress.policy_rows_page(self.request, datasource_id,
+                                              table_name, **page))
                 if congress.TABLE_SEPARATOR in table_name:
                     table_name_parts = table_name.split(
                         congress.TABLE_SEPARATOR)
                     maybe_datasource_name = table_name_parts[0]
-                    datasources = congress.datasources_list(self.request)
-                    for datasource in datasources:
-                        if datasource['name'] == maybe_datasource_name:
-                            # Service-derived policy data table.
-                            is_service = True
-                            datasource_id = datasource['id']
-                            table_name = table_name_parts[1]
-                            break
+                    datasources = congress.datasources_index(self.request)
+                    datasource = datasources.get_by_name(
+                        maybe_datasource_name)
+                    if datasource is not None:
+                        # Service-derived policy data table.
+                        is_service = True
+                        datasource_id = datasource['id']
+                        table_name = table_name_parts[1]
             else:
                 # Service data table.
                 is_service = True
                 datasource = congress.datasource_get_by_name(
                     self.request, datasource_id)
                 table_name = self.kwargs['service_table_name']
-                rows = congress.datasource_rows_list(
-                    self.request, datasource_id, table_name)
+                rows, self._has_prev_data, self._has_more_data = (
+                    congress.datasource_rows_page(
+                        self.request, datasource_id, table_name, **page))
         except Exception as e:
             msg_args = {
                 'table_name': table_name,
@@ -162,14 +221,6 @@ class DetailView(tables.DataTableView):
             redirect = reverse('horizon:admin:datasources:index')
             raise exceptions.Http302(redirect)
 
-        # Normally, in Horizon, the columns for a table are defined as
-        # attributes of the Table class. When the class is instantiated,
-        # the columns are processed during the metaclass initialization. To
-        # add columns dynamically, re-create the class from the metaclass
-        # with the added columns, re-create the Table from the new class,
-        # then reassign the Table stored in this View.
-        column_names = []
-        table_class_attrs = copy.deepcopy(dict(self.table_class.__dict__))
         # Get schema from the server.
         schema = {}
         try:
@@ -179,66 +230,58 @@ class DetailView(tables.DataTableView):
             else:
                 schema = congress.policy_table_schema_get(
                     self.request, datasource_id, table_name)
-        except Exception as e:
+        except Exception:
             # Unable to get the schema, might be atomic rule, just display
             # without column names ...
             schema['columns'] = []
 
         row_len = 0
         if len(rows):
-            row_len = len(rows[0].get('data', []))
+            row_len = len(rows[0])
 
-        columns = schema['columns']
-        if not row_len or row_len == len(columns):
-            for col in columns:
+        # (attribute name, verbose name) of each column.
+        columns = []
+        if not row_len or row_len == len(schema['columns']):
+            for col in schema['columns']:
                 col_name = col['name']
                 # Attribute name for column in the class must be a valid
                 # identifier. Slugify it.
-                col_slug = slugify(col_name)
-                column_names.append(col_slug)
-                table_class_attrs[col_slug] = tables.Column(
-                    col_slug, verbose_name=col_name)
+                columns.append((slugify(col_name), col_name))
         else:
             # There could be another table with the same name and different
             # arity. Divide the rows into unnamed columns. Number them for
             # internal reference.
-            for i in range(0, row_len):
-                col_name = str(i)
-                column_names.append(col_name)
-                table_class_attrs[col_name] = tables.Column(
-                    col_name, verbose_name='')
-
-        # Class and object re-creation, using a new class name, the same base
-        # classes, and the new class attributes, which now includes columns.
-        columnized_table_class_name = '%s%sRows' % (
-            slugify(datasource_id).title(), slugify(table_name).title())
-        columnized_table_class = tables.base.DataTableMetaclass(
-            str(columnized_table_class_name), self.table_class.__bases__,
-            table_class_attrs)
+            columns = [(str(i), '') for i in range(0, row_len)]
+        column_names = [name for name, verbose_name in columns]
 
+        # Normally, in Horizon, the columns for a table are defined as
+        # attributes of the Table class. When the class is instantiated,
+        # the columns are processed during the metaclass initialization. To
+        # add columns dynamically, re-create the class from the metaclass
+        # with the added columns, re-create the Table from the new class,
+        # then reassign the Table stored in this View.
+        columnized_table_class = _get_columnized_table_class(
+            self.table_class, datasource_id, table_name, tuple(columns))
         self.table_class = columnized_table_class
         columnized_table = columnized_table_class(self.request, **self.kwargs)
         self._tables[columnized_table_class._meta.name] = columnized_table
 
-        # Map columns names to row values.
+        # Map columns names to row values. All rows share the same column
+        # names, so name them once for the whole table.
         num_cols = len(column_names)
         for row in rows:
-            try:
-                row_data = row['data']
-                row.delete_by_key('data')
-                for i in range(0, num_cols):
-                    row.set_value(column_names[i], row_data[i])
-            except Exception as e:
+            if len(row) < num_cols:
                 msg_args = {
                     'table_name': table_name,
                     'ds_id': datasource_id,
-                    'error': str(e)
+                    'error': _('row %s has too few values') % row.id
                 }
                 msg = _('Unable to get data for table "%(table_name)s", data '
                         'source "%(ds_id)s": %(error)s') % msg_args
                 messages.error(self.request, msg)
                 redirect = reverse('horizon:admin:datasources:index')
                 raise exceptions.Http302(redirect)
+        rows.set_columns(column_names)
         return rows
 
     def get_context_data(self, **kwargs):
@@ -262,3 +305,137 @@ class DetailView(tables.DataTableView):
         context['datasource_name'] = datasource_name
         context['table_name'] = table_name
         return context
+
+
+class _Echo(object):
+    """File-like object whose write() returns what was written."""
+    def write(self, value):
+        return value
+
+
+def _iter_csv(column_names, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(column_names)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _iter_json(column_names, rows):
+    separator = '['
+    for row in rows:
+        yield separator + json.dumps(dict(zip(column_names, row)))
+        separator = ',\n'
+    yield '[]\n' if separator == '[' else ']\n'
+
+
+def _iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class ExportView(generic.View):
+    """Stream all rows of a data source or policy table as CSV or JSON.
+
+    Rows are decoded from the Congress response and written out one at a
+    time, so memory use doesn't depend on the size of the table. Use the
+    'format' query parameter to choose between 'csv' (the default) and
+    'json', and 'gzip=1' to compress the output.
+    """
+    formats = {
+        'csv': ('text/csv', _iter_csv),
+        'json': ('application/json', _iter_json),
+    }
+
+    def _get_column_names(self, request, datasource_id, table_name,
+                          is_policy):
+        try:
+            if not is_policy:
+                schema = congress.datasource_table_schema_get_by_name(
+                    request, datasource_id, table_name)
+            elif congress.TABLE_SEPARATOR in table_name:
+                # Possibly a service-derived policy data table.
+                datasource_name, service_table_name = table_name.split(
+                    congress.TABLE_SEPARATOR, 1)
+                datasources = congress.datasources_index(request)
+                if datasources.get_by_name(datasource_name) is not None:
+                    schema = congress.datasource_table_schema_get_by_name(
+                        request, datasource_name, service_table_name)
+                else:
+                    schema = congress.policy_table_schema_get(
+                        request, datasource_id, table_name)
+            else:
+                schema = congress.policy_table_schema_get(
+                    request, datasource_id, table_name)
+        except Exception:
+            # Unable to get the schema, might be atomic rule, just export
+            # with numbered columns ...
+            return []
+        return [col['name'] for col in schema['columns']]
+
+    def get(self, request, datasource_id, service_table_name=None,
+            policy_table_name=None):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in self.formats:
+            raise http.Http404(_('Unknown export format "%s"') %
+                               export_format)
+        content_type, serialize = self.formats[export_format]
+
+        table_name = policy_table_name or service_table_name
+        if policy_table_name:
+            rows = congress.policy_rows_iter(request, datasource_id,
+                                             table_name)
+        else:
+            rows = congress.datasource_rows_iter(request, datasource_id,
+                                                 table_name)
+        column_names = self._get_column_names(request, datasource_id,
+                                              table_name,
+                                              bool(policy_table_name))
+
+        # Start streaming now, so that errors are reported before the
+        # response begins.
+        try:
+            first = next(rows)
+        except StopIteration:
+            first = None
+        except Exception as e:
+            msg_args = {
+                'table_name': table_name,
+                'ds_id': datasource_id,
+                'error': str(e)
+            }
+            msg = _('Unable to export table "%(table_name)s", data source '
+                    '"%(ds_id)s": %(error)s') % msg_args
+            messages.error(request, msg)
+            redirect = reverse('horizon:admin:datasources:index')
+            raise exceptions.Http302(redirect)
+
+        if first is None:
+            rows = iter(())
+        else:
+            if len(first) != len(column_names):
+                column_names = [str(i) for i in range(len(first))]
+            rows = _chain_first(first, rows)
+
+        chunks = serialize(column_names, rows)
+        filename = '%s-%s.%s' % (slugify(datasource_id), slugify(table_name),
+                                 export_format)
+        if request.GET.get('gzip') in ('1', 'true', 'True'):
+            chunks = _iter_gzip(chunks)
+            content_type = 'application/gzip'
+            filename += '.gz'
+
+        response = http.StreamingHttpResponse(chunks,
+                                              content_type=content_type)
+        response['Content-Disposition'] = ('attachment; filename="%s"' %
+                                           filename)
+        return response
+
+
+def _chain_first(first, rows):
+    yield first
+    for row in rows:
+        yield row
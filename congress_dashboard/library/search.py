@@ -0,0 +1,190 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Full-text search over the policy library.
+
+An inverted index maps the terms of each library policy's name, description,
+rules and referenced tables to the policies containing them. It is built
+from a single listing of the library with rules, and rebuilt only when the
+contents of the library change.
+"""
+
+import bisect
+import collections
+import hashlib
+import json
+import math
+import re
+
+from congress_dashboard.api import cache
+from congress_dashboard.api import congress
+from congress_dashboard.api import datalog
+
+
+# Weight of a term depending on where it appears in a policy.
+FIELD_WEIGHTS = {
+    'name': 4.0,
+    'table': 3.0,
+    'description': 2.0,
+    'rule': 1.0,
+}
+
+# Number of library versions whose indexes are kept.
+INDEX_CACHE_SIZE = 4
+
+_WORD_RE = re.compile(r'[\w\-]+')
+
+_indexes = cache.LRU(INDEX_CACHE_SIZE)
+
+
+def _words(text):
+    return _WORD_RE.findall(text.lower())
+
+
+def _table_terms(table):
+    """Index 'nova:servers' as itself and as 'nova' and 'servers'."""
+    table = table.lower()
+    terms = [table]
+    if congress.TABLE_SEPARATOR in table:
+        terms.extend(_words(table))
+    return terms
+
+
+def _rule_terms(rule):
+    """Return the words and the referenced tables of a rule."""
+    try:
+        parsed = datalog.parse_rule(rule)
+    except datalog.DatalogSyntaxError:
+        return _words(rule), []
+    tables = []
+    for literal in parsed.heads + parsed.body:
+        tables.extend(_table_terms(literal.table))
+        if literal.modal:
+            tables.append(literal.modal.lower())
+    return _words(rule), tables
+
+
+class LibraryIndex(object):
+    """Inverted index over library policies."""
+
+    def __init__(self, policies):
+        self.policies = policies
+        postings = collections.defaultdict(dict)
+        # Terms appearing as referenced tables, by policy position.
+        table_postings = collections.defaultdict(set)
+
+        def add(term, position, weight):
+            scores = postings[term]
+            scores[position] = scores.get(position, 0.0) + weight
+
+        for position, policy in enumerate(policies):
+            for word in _words(policy.get('name') or ''):
+                add(word, position, FIELD_WEIGHTS['name'])
+            for word in _words(policy.get('description') or ''):
+                add(word, position, FIELD_WEIGHTS['description'])
+            for r in policy.get('rules') or ():
+                words, tables = _rule_terms(r.get('rule') or '')
+                for word in words:
+                    add(word, position, FIELD_WEIGHTS['rule'])
+                for term in tables:
+                    add(term, position, FIELD_WEIGHTS['table'])
+                    table_postings[term].add(position)
+                for word in _words(r.get('comment') or ''):
+                    add(word, position, FIELD_WEIGHTS['rule'])
+
+        self._postings = dict(postings)
+        self._table_postings = dict(table_postings)
+        self._terms = sorted(self._postings)
+
+    def _expand(self, prefix):
+        """Return the indexed terms starting with the prefix."""
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + '\uffff', start)
+        return self._terms[start:end]
+
+    def search(self, query, tables_only=False):
+        """Return the policies matching every term of the query, best first.
+
+        Query terms match indexed terms they are a prefix of, except for
+        table names, such as 'nova:servers', which must match exactly. When
+        tables_only is set, only tables referenced by rules are matched.
+        """
+        query = query.lower().strip()
+        if not query:
+            return []
+        terms = query.split()
+        total = float(len(self.policies))
+        scores = None
+        for term in terms:
+            if congress.TABLE_SEPARATOR in term:
+                expanded = [term] if term in self._postings else []
+            else:
+                expanded = [t for t in self._expand(term)
+                            if not tables_only or t in self._table_postings]
+            term_scores = {}
+            for t in expanded:
+                posting = self._postings[t]
+                idf = math.log(1 + total / len(posting))
+                for position, weight in posting.items():
+                    if (tables_only and
+                            position not in self._table_postings[t]):
+                        continue
+                    term_scores[position] = (term_scores.get(position, 0.0) +
+                                             weight * idf)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = dict((position, score + term_scores[position])
+                              for position, score in scores.items()
+                              if position in term_scores)
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self.policies[position] for position, score in ranked]
+
+
+@cache.shared('library', local=True)
+def get_library(request):
+    """Get the policies of the library, with their rules, and a version.
+
+    The library is kept in process when the shared cache is disabled, so
+    that searching doesn't download and hash it every time. Callers must
+    not modify it.
+    """
+    policies = [dict(p._apidict) for p in
+                congress.list_policies_from_library(request,
+                                                    include_rules=True)]
+    digest = hashlib.sha1(json.dumps(policies, sort_keys=True,
+                                     default=str).encode('utf-8'))
+    return {'version': digest.hexdigest(), 'policies': policies}
+
+
+def get_library_index(request):
+    """Get the index of the library, built once per version of it."""
+    library = get_library(request)
+    version = library['version']
+    index = _indexes.get(version)
+    if index is None:
+        index = LibraryIndex(library['policies'])
+        _indexes.put(version, index)
+    return index
+
+
+def search_library(request, query, tables_only=False):
+    """Search the library, returning matching policies without rules."""
+    results = []
+    for policy in get_library_index(request).search(query, tables_only):
+        policy = dict(policy)
+        policy.pop('rules', None)
+        results.append(congress.PolicyAPIDictWrapper(policy))
+    return results
@@ -12,20 +12,24 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-from django.template.defaultfilters import linebreaksbr
+import logging
+
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ungettext_lazy
 from horizon import tables
 
 from congress_dashboard.api import congress
+from congress_dashboard.common import tables as common_tables
+
+LOG = logging.getLogger(__name__)
 
 
 def get_policy_link(datum):
     return reverse('horizon:admin:library:detail', args=(datum['id'],))
 
 
-class ActivatePolicy(tables.BatchAction):
+class ActivatePolicy(common_tables.ConcurrentBatchMixin, tables.BatchAction):
     name = 'activate_policy'
     verbose_name = _('Activate')
     icon = 'plus'
@@ -34,7 +38,7 @@ class ActivatePolicy(tables.BatchAction):
     def action_present(count):
         return ungettext_lazy(
             u"Activate Policy",
-            u"Activate Policy",
+            u"Activate Policies",
             count
         )
 
@@ -42,13 +46,40 @@ class ActivatePolicy(tables.BatchAction):
     def action_past(count):
         return ungettext_lazy(
             u"Activated Policy",
-            u"Activated Policy",
+            u"Activated Policies",
             count
         )
 
     def action(self, request, obj_id):
         congress.policy_create(request, {}, obj_id)
 
+    def _get_conflicts(self, request, names):
+        """Return the names of policies which already exist."""
+        try:
+            policies = congress.policies_list(request)
+        except Exception as e:
+            # Let Congress reject conflicting policies itself.
+            LOG.warning('Unable to check policy names before activating '
+                        'them: %s', str(e))
+            return set()
+        return set(names).intersection(p['name'] for p in policies)
+
+    def exclude(self, request, selected):
+        # Policies whose name is already taken are not sent to Congress.
+        conflicts = self._get_conflicts(
+            request, [display for obj_id, datum, display in selected])
+        return [(obj_id, _('a policy with this name already exists'))
+                for obj_id, datum, display in selected
+                if display in conflicts]
+
+
+class SearchLibrary(tables.FilterAction):
+    name = 'search_library'
+    verbose_name = _('Search')
+    filter_type = 'server'
+    filter_choices = (('text', _('Text ='), True),
+                      ('table', _('Table ='), True))
+
 
 class LibraryTable(tables.DataTable):
     id = tables.Column("id", verbose_name=_("Policy ID"), hidden=True,
@@ -61,15 +92,26 @@ class LibraryTable(tables.DataTable):
     class Meta(object):
         name = "policy_library"
         verbose_name = _("Policy Library")
+        table_actions = (SearchLibrary, ActivatePolicy)
         row_actions = (ActivatePolicy, )
         hidden_title = True
 
 
-class LibraryPolicyRulesTable(tables.DataTable):
+class RulesPage(list):
+    """A page of rules, remembering its position in the policy."""
+
+    def __init__(self, offset=0):
+        super(RulesPage, self).__init__()
+        self.offset = offset
+
+
+class LibraryPolicyRulesTable(common_tables.PositionPagedTableMixin,
+                              tables.DataTable):
+    # Rules are paged by position, since their ids aren't ordered.
     name = tables.Column("name", verbose_name=_("Rule Name"),
                          classes=('nowrap-col',))
     rule = tables.Column("rule", verbose_name=_("Rule"),
-                         filters=(congress.format_rule, linebreaksbr,))
+                         filters=(congress.format_rule_html,))
     comment = tables.WrappingColumn("comment", verbose_name=_("Comment"))
 
     class Meta(object):
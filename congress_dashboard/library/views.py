@@ -12,18 +12,74 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
+import hashlib
+import json
 import logging
-import uuid
 
 from django.utils.translation import ugettext_lazy as _
 from horizon import messages
 from horizon import tables
+from horizon.utils import functions as utils
 
+from congress_dashboard.api import cache
 from congress_dashboard.api import congress
+from congress_dashboard.api import datalog
+from congress_dashboard.library import search
 from congress_dashboard.library import tables as library_tables
 
 LOG = logging.getLogger(__name__)
 
+# Number of library policy versions whose rule names and ids are kept.
+RULE_DETAILS_CACHE_SIZE = 64
+
+_rule_details = cache.LRU(RULE_DETAILS_CACHE_SIZE)
+
+
+def _get_rules_version(rules):
+    """Hash the contents of the rules of a library policy."""
+    digest = hashlib.sha1()
+    for r in rules:
+        digest.update(json.dumps([r.get('rule'), r.get('name'),
+                                  r.get('comment')]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _get_rule_details(policy_id, rules):
+    """Return the (id, display name) of each rule of a library policy.
+
+    Ids are hashes of the rules' text, so they stay the same from one
+    render to the next. Identical rules get numbered ids. Details are
+    derived once per version of the policy's rules.
+    """
+    key = (policy_id, _get_rules_version(rules))
+    details = _rule_details.get(key)
+    if details is not None:
+        return details
+
+    details = []
+    occurrences = collections.Counter()
+    for r in rules:
+        rule_id = hashlib.sha1(r['rule'].encode('utf-8')).hexdigest()[:16]
+        occurrences[rule_id] += 1
+        if occurrences[rule_id] > 1:
+            rule_id = '%s-%d' % (rule_id, occurrences[rule_id])
+        details.append((rule_id, _get_rule_name(r['rule'])))
+
+    _rule_details.put(key, details)
+    return details
+
+
+def _get_rule_name(rule):
+    """Derive a display name for a rule from the table in its head."""
+    try:
+        head = datalog.parse_rule(rule).head
+        name = head.modal or head.table
+    except datalog.DatalogSyntaxError:
+        head = rule.split(congress.RULE_SEPARATOR)[0]
+        name = head.split('(')[0].split('[')[0]
+    return name.replace('_', ' ').title()
+
 
 class IndexView(tables.DataTableView):
     """List policies from library."""
@@ -32,6 +88,11 @@ class IndexView(tables.DataTableView):
 
     def get_data(self):
         try:
+            filter_info = self.get_server_filter_info(self.request)
+            if filter_info and filter_info['value']:
+                return search.search_library(
+                    self.request, filter_info['value'],
+                    tables_only=filter_info['field'] == 'table')
             policies = congress.list_policies_from_library(self.request,
                                                            include_rules=False)
             return policies
@@ -42,36 +103,52 @@ class IndexView(tables.DataTableView):
             return []
 
 
-class DetailView(tables.DataTableView):
-    """List details about and rules in a policy."""
+class DetailView(tables.PagedTableMixin, tables.DataTableView):
+    """List details about and rules in a policy.
+
+    The policy is fetched once per request, and only the rules of the
+    current page are rendered.
+    """
     table_class = library_tables.LibraryPolicyRulesTable
     template_name = 'admin/library/detail.html'
 
+    def _get_policy(self):
+        if not hasattr(self, '_policy'):
+            self._policy = congress.show_library_policy(
+                self.request, self.kwargs['policy_name'])
+        return self._policy
+
     def get_data(self):
         try:
             policy_id = self.kwargs['policy_name']
-            rules = congress.show_library_policy(self.request,
-                                                 policy_id)['rules']
-            for r in rules:
-                head = r['rule'].split(congress.RULE_SEPARATOR)[0]
-                name = (head.split('(')[0]).replace('_', ' ').title()
-                name = name.split('[')[0]
-                r.set_value('name', name)
-                r.set_id_if_empty(uuid.uuid4())
-            return rules
+            rules = self._get_policy()['rules']
+            details = _get_rule_details(policy_id, rules)
         except Exception as e:
             msg = _('Unable to list rules of library policy: %s') % str(e)
             LOG.exception(msg)
             messages.error(self.request, msg)
             return []
 
+        marker, sort_dir = self._get_marker()
+        # An ascending sort direction asks for the page before the marker.
+        start, end = congress.get_page_bounds(
+            marker, utils.get_page_size(self.request), len(rules),
+            reverse=sort_dir == 'asc')
+        self._has_prev_data = start > 0
+        self._has_more_data = end < len(rules)
+
+        page = library_tables.RulesPage(start)
+        for r, (rule_id, name) in zip(rules[start:end], details[start:end]):
+            r.set_value('name', name)
+            r.set_id_if_empty(rule_id)
+            page.append(r)
+        return page
+
     def get_context_data(self, **kwargs):
         context = super(DetailView, self).get_context_data(**kwargs)
         try:
             policy_id = self.kwargs['policy_name']
-            policy = congress.show_library_policy(self.request, policy_id,
-                                                  include_rules=False)
-            context['policy'] = policy
+            context['policy'] = self._get_policy()
             return context
         except Exception as e:
             margs = {'id': policy_id, 'error': str(e)}
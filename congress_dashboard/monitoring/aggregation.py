@@ -0,0 +1,87 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Group-by counting of table rows, one column at a time.
+
+The values of the grouped column are dictionary encoded into a compact array
+of integer codes while the rows stream in, then counted in a single pass
+over the codes, with NumPy when it is installed.
+"""
+
+import array
+import collections
+import heapq
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class EncodedColumn(object):
+    """A column of values, dictionary encoded as integer codes."""
+
+    def __init__(self):
+        self.codes = array.array('l')
+        self.dictionary = []
+        self._index = {}
+
+    def extend(self, values):
+        index = self._index
+        dictionary = self.dictionary
+        append_code = self.codes.append
+        for value in values:
+            try:
+                code = index[value]
+            except KeyError:
+                code = index[value] = len(dictionary)
+                dictionary.append(value)
+            except TypeError:
+                # Unhashable value, group it by its text.
+                value = str(value)
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(dictionary)
+                    dictionary.append(value)
+            append_code(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def count(self):
+        """Return the number of rows holding each value, indexed by code."""
+        if numpy is not None:
+            codes = numpy.frombuffer(self.codes, dtype=self.codes.typecode)
+            return numpy.bincount(
+                codes, minlength=len(self.dictionary)).tolist()
+        counts = [0] * len(self.dictionary)
+        for code, n in collections.Counter(self.codes).items():
+            counts[code] = n
+        return counts
+
+
+def encode_column(rows, column_index):
+    """Dictionary encode one column of rows given as lists of values."""
+    column = EncodedColumn()
+    column.extend(row[column_index] for row in rows
+                  if column_index < len(row))
+    return column
+
+
+def top_groups(column, limit=None):
+    """Return the (value, count) of the largest groups, largest first."""
+    counts = column.count()
+    groups = zip(column.dictionary, counts)
+    if limit is None or limit >= len(counts):
+        return sorted(groups, key=lambda g: g[1], reverse=True)
+    return heapq.nlargest(limit, groups, key=lambda g: g[1])
@@ -0,0 +1,127 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Optional background collector of policy violation counts.
+
+When CONGRESS_MONITORING_POLLER_ENABLED is set, every dashboard process
+starts a daemon thread which counts the rows of each policy's error and
+warning tables every CONGRESS_MONITORING_POLL_INTERVAL seconds, using the
+service credentials in CONGRESS_MONITORING_CREDENTIALS, and records them in
+the violations history. The thread starts once the Monitoring panel is
+first viewed in the process. When the history is shared between processes,
+a lease held in it elects a single process to collect at a time.
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from congress_dashboard.api import concurrency
+from congress_dashboard.api import congress
+from congress_dashboard.datasources import utils as ds_utils
+from congress_dashboard.monitoring import history
+
+
+LOG = logging.getLogger(__name__)
+
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def collect_violations(client):
+    """Count error and warning rows of every policy, with the given client.
+
+    Returns a dict mapping each policy name to (errors, warnings). Policies
+    whose tables or rows can't be fetched are left out.
+    """
+    policies = client.list_policy()['results']
+
+    def count_violations(policy):
+        tables = client.list_policy_tables(policy['name'])['results']
+        table_names = set(table['id'] for table in tables)
+        return tuple(
+            congress.count_policy_rows(client, policy['name'], t)
+            if t in table_names else 0
+            for t in ds_utils.VIOLATIONS_TABLES)
+
+    counts = {}
+    outcomes = concurrency.map_isolated(count_violations, policies)
+    for policy, outcome in zip(policies, outcomes):
+        if outcome.error is not None:
+            LOG.error('Unable to count violations of policy "%s": %s',
+                      policy['name'], str(outcome.error))
+            continue
+        counts[policy['name']] = outcome.value
+    return counts
+
+
+class Collector(threading.Thread):
+    """Daemon thread recording violation counts into the history."""
+
+    def __init__(self, interval, credentials):
+        super(Collector, self).__init__(name='congress-monitoring',
+                                        daemon=True)
+        self.interval = interval
+        self.credentials = credentials
+        self.token = uuid.uuid4().hex
+        self._stopped = threading.Event()
+        self._client = None
+
+    def stop(self):
+        self._stopped.set()
+
+    def is_leader(self):
+        """Take or renew the lease of the collector, or tell if it's taken."""
+        return history.get_store().acquire_lease(self.token,
+                                                 2 * self.interval)
+
+    def collect(self):
+        if self._client is None:
+            self._client = congress.service_congressclient(self.credentials)
+        counts = collect_violations(self._client)
+        history.get_store().record(time.time(), counts)
+        LOG.debug('Recorded violations of %d policies', len(counts))
+
+    def run(self):
+        while not self._stopped.is_set():
+            started = time.time()
+            try:
+                if self.is_leader():
+                    self.collect()
+            except Exception as e:
+                LOG.error('Unable to collect policy violations: %s', str(e))
+                # Authenticate again on the next run.
+                self._client = None
+            elapsed = time.time() - started
+            self._stopped.wait(max(self.interval - elapsed, 0))
+
+
+def is_enabled():
+    return getattr(settings, 'CONGRESS_MONITORING_POLLER_ENABLED', False)
+
+
+def start():
+    """Start this process's collector if enabled and not yet running."""
+    global _collector
+    if not is_enabled():
+        return None
+    with _collector_lock:
+        if _collector is None:
+            credentials = getattr(settings, 'CONGRESS_MONITORING_CREDENTIALS',
+                                  {})
+            _collector = Collector(history.get_interval(), credentials)
+            _collector.start()
+    return _collector
@@ -0,0 +1,251 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""History of policy violation counts recorded by the collector.
+
+Samples are (timestamp, errors, warnings) per policy. Recent samples are
+kept as collected; older ones are downsampled to one averaged sample per
+DOWNSAMPLE_INTERVAL and eventually dropped.
+
+By default, the history is a SQLite file in Horizon's LOCAL_PATH, shared by
+the dashboard processes of the host, which also holds the lease electing the
+single process recording violations.
+"""
+
+import collections
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+
+LOG = logging.getLogger(__name__)
+
+# Seconds raw samples are kept before being downsampled.
+RAW_RETENTION = 24 * 3600
+# Seconds covered by each downsampled sample.
+DOWNSAMPLE_INTERVAL = 3600
+# Name of the history file, in LOCAL_PATH, when no path is configured.
+HISTORY_FILENAME = 'congress_monitoring.sqlite'
+# Seconds downsampled samples are kept.
+HISTORY_RETENTION = 30 * 24 * 3600
+
+Sample = collections.namedtuple('Sample', ['timestamp', 'errors', 'warnings'])
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class RingBufferStore(object):
+    """Fixed-size, in-memory history, local to the dashboard process."""
+
+    def __init__(self, interval):
+        self._raw_size = max(RAW_RETENTION // max(interval, 1), 1)
+        self._downsampled_size = HISTORY_RETENTION // DOWNSAMPLE_INTERVAL
+        self._raw = {}
+        self._downsampled = {}
+        self._latest = None
+        self._lock = threading.Lock()
+
+    def record(self, timestamp, counts):
+        with self._lock:
+            for policy_name, (errors, warnings) in counts.items():
+                raw = self._raw.get(policy_name)
+                if raw is None:
+                    raw = collections.deque(maxlen=self._raw_size)
+                    self._raw[policy_name] = raw
+                if len(raw) == raw.maxlen:
+                    self._downsample(policy_name, raw[0])
+                raw.append(Sample(timestamp, errors, warnings))
+            self._latest = (timestamp, dict(counts))
+
+    def _downsample(self, policy_name, sample):
+        # Fold the sample about to be evicted into its bucket, as a running
+        # average: (timestamp, errors, warnings, number of samples).
+        downsampled = self._downsampled.get(policy_name)
+        if downsampled is None:
+            downsampled = collections.deque(maxlen=self._downsampled_size)
+            self._downsampled[policy_name] = downsampled
+        bucket = sample.timestamp - sample.timestamp % DOWNSAMPLE_INTERVAL
+        if downsampled and downsampled[-1][0] == bucket:
+            _, errors, warnings, n = downsampled[-1]
+            downsampled[-1] = (bucket, errors + sample.errors,
+                               warnings + sample.warnings, n + 1)
+        else:
+            downsampled.append((bucket, sample.errors, sample.warnings, 1))
+
+    def acquire_lease(self, holder, duration):
+        # Each process records into its own history.
+        return True
+
+    def latest(self):
+        with self._lock:
+            return self._latest
+
+    def series(self, since):
+        with self._lock:
+            result = {}
+            for policy_name, raw in self._raw.items():
+                samples = [Sample(bucket, float(errors) / n,
+                                  float(warnings) / n)
+                           for bucket, errors, warnings, n in
+                           self._downsampled.get(policy_name, ())
+                           if bucket >= since]
+                samples.extend(s for s in raw if s.timestamp >= since)
+                result[policy_name] = samples
+            return result
+
+
+class SQLiteStore(object):
+    """History kept in a SQLite file, shared by the processes of a host."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS samples ('
+                         'policy TEXT NOT NULL, '
+                         'resolution INTEGER NOT NULL, '
+                         'timestamp INTEGER NOT NULL, '
+                         'errors REAL NOT NULL, '
+                         'warnings REAL NOT NULL, '
+                         'PRIMARY KEY (policy, resolution, timestamp))')
+            conn.execute('CREATE TABLE IF NOT EXISTS lease ('
+                         'id INTEGER PRIMARY KEY CHECK (id = 0), '
+                         'holder TEXT NOT NULL, '
+                         'expires REAL NOT NULL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def record(self, timestamp, counts):
+        timestamp = int(timestamp)
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO samples VALUES (?, 0, ?, ?, ?)',
+                [(policy_name, timestamp, errors, warnings)
+                 for policy_name, (errors, warnings) in counts.items()])
+            # Keep the set of policies of the latest sample recoverable,
+            # even for policies without violations.
+            conn.execute('DELETE FROM samples WHERE resolution = -1')
+            conn.executemany(
+                'INSERT INTO samples VALUES (?, -1, ?, ?, ?)',
+                [(policy_name, timestamp, errors, warnings)
+                 for policy_name, (errors, warnings) in counts.items()])
+            self._downsample(conn, timestamp)
+
+    def acquire_lease(self, holder, duration):
+        """Take or renew the lease of the recording process.
+
+        Returns whether the holder has the lease for the next 'duration'
+        seconds. Both statements run in one write transaction, so a single
+        process of the host can hold the lease at a time.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR IGNORE INTO lease VALUES (0, ?, ?)',
+                         (holder, now + duration))
+            cursor = conn.execute(
+                'UPDATE lease SET holder = ?, expires = ? '
+                'WHERE id = 0 AND (holder = ? OR expires <= ?)',
+                (holder, now + duration, holder, now))
+            return cursor.rowcount == 1
+
+    def _downsample(self, conn, now):
+        cutoff = now - RAW_RETENTION
+        cutoff -= cutoff % DOWNSAMPLE_INTERVAL
+        conn.execute(
+            'INSERT OR REPLACE INTO samples '
+            'SELECT policy, ?, timestamp - timestamp %% %d AS bucket, '
+            'AVG(errors), AVG(warnings) FROM samples '
+            'WHERE resolution = 0 AND timestamp < ? '
+            'GROUP BY policy, bucket' % DOWNSAMPLE_INTERVAL,
+            (DOWNSAMPLE_INTERVAL, cutoff))
+        conn.execute('DELETE FROM samples WHERE resolution = 0 AND '
+                     'timestamp < ?', (cutoff,))
+        conn.execute('DELETE FROM samples WHERE resolution = ? AND '
+                     'timestamp < ?',
+                     (DOWNSAMPLE_INTERVAL, now - HISTORY_RETENTION))
+
+    def latest(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT policy, timestamp, errors, warnings FROM samples '
+                'WHERE resolution = -1').fetchall()
+        if not rows:
+            return None
+        counts = dict((policy_name, (int(errors), int(warnings)))
+                      for policy_name, _, errors, warnings in rows)
+        return rows[0][1], counts
+
+    def series(self, since):
+        with self._connect() as conn:
+            rows = conn.execute('SELECT policy, timestamp, errors, warnings '
+                                'FROM samples WHERE resolution >= 0 AND '
+                                'timestamp >= ? ORDER BY timestamp',
+                                (int(since),)).fetchall()
+        result = collections.defaultdict(list)
+        for policy_name, timestamp, errors, warnings in rows:
+            result[policy_name].append(Sample(timestamp, errors, warnings))
+        return dict(result)
+
+
+def get_path():
+    """Return the path of the history file, or None to keep it in memory."""
+    default = None
+    local_path = getattr(settings, 'LOCAL_PATH', None)
+    if local_path:
+        default = os.path.join(local_path, HISTORY_FILENAME)
+    return getattr(settings, 'CONGRESS_MONITORING_HISTORY_PATH', default)
+
+
+def get_store():
+    """Return the history store configured for this process."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = get_path()
+                if path:
+                    try:
+                        _store = SQLiteStore(path)
+                    except sqlite3.Error as e:
+                        LOG.warning('Unable to open the violations history '
+                                    '%s, keeping it in memory: %s', path,
+                                    str(e))
+                if _store is None:
+                    _store = RingBufferStore(get_interval())
+    return _store
+
+
+def get_interval():
+    return getattr(settings, 'CONGRESS_MONITORING_POLL_INTERVAL', 60)
+
+
+def get_latest(max_age=None):
+    """Return the latest (timestamp, counts), or None if none is recent.
+
+    Counts map policy names to (errors, warnings). By default, samples older
+    than three poll intervals are not considered recent.
+    """
+    latest = get_store().latest()
+    if latest is None:
+        return None
+    if max_age is None:
+        max_age = 3 * get_interval()
+    if time.time() - latest[0] > max_age:
+        return None
+    return latest
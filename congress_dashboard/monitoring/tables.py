@@ -13,9 +13,16 @@
 # under the License.
 
 from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.html import format_html_join
 from django.utils.translation import ugettext_lazy as _
 from horizon import tables
 
+from congress_dashboard.monitoring import collector
+
+SPARKLINE_WIDTH = 120
+SPARKLINE_HEIGHT = 24
+
 
 def get_policy_url(obj):
     return reverse('horizon:admin:policies:detail', args=(obj['policy_name'],))
@@ -35,6 +42,52 @@ def get_warning_table(obj):
                    args=(obj['policy_name'], 'warning'))
 
 
+def _get_points(samples, field, start, duration, top):
+    points = []
+    for sample in samples:
+        x = SPARKLINE_WIDTH * (sample.timestamp - start) / duration
+        y = SPARKLINE_HEIGHT - 1 - ((SPARKLINE_HEIGHT - 2) *
+                                    getattr(sample, field) / top)
+        points.append(('%.1f,%.1f' % (x, y),))
+    return format_html_join(' ', '{}', points)
+
+
+def sparkline(samples):
+    """Render the errors and warnings in the samples as an inline SVG."""
+    if not samples or len(samples) < 2:
+        return '-'
+    start = samples[0].timestamp
+    duration = float(samples[-1].timestamp - start) or 1.0
+    top = max(max(s.errors, s.warnings) for s in samples) or 1.0
+    return format_html(
+        '<svg class="violations-trend" width="{0}" height="{1}" '
+        'viewBox="0 0 {0} {1}">'
+        '<polyline fill="none" stroke="#d9534f" points="{2}"/>'
+        '<polyline fill="none" stroke="#f0ad4e" points="{3}"/></svg>',
+        SPARKLINE_WIDTH, SPARKLINE_HEIGHT,
+        _get_points(samples, 'errors', start, duration, top),
+        _get_points(samples, 'warnings', start, duration, top))
+
+
+class GroupErrors(tables.LinkAction):
+    name = 'group_errors'
+    verbose_name = _('Group Errors')
+    table_name = 'error'
+
+    def get_link_url(self, datum):
+        return reverse('horizon:admin:monitoring:groups',
+                       args=(datum['policy_name'], self.table_name))
+
+    def allowed(self, request, datum):
+        return bool(datum and datum.get(self.table_name))
+
+
+class GroupWarnings(GroupErrors):
+    name = 'group_warnings'
+    verbose_name = _('Group Warnings')
+    table_name = 'warning'
+
+
 class MonitoringTable(tables.DataTable):
     errors = tables.Column("error", verbose_name=_("Errors"),
                            link=get_error_table)
@@ -47,8 +100,35 @@ class MonitoringTable(tables.DataTable):
                                        verbose_name=_("Policy Description"))
     policy_owner_id = tables.Column("policy_owner_id",
                                     verbose_name=_("Policy Owner"))
+    trend = tables.Column("trend", verbose_name=_("Trend"),
+                          filters=(sparkline,))
+
+    def __init__(self, request, data=None, needs_form_wrapper=None,
+                 **kwargs):
+        super(MonitoringTable, self).__init__(
+            request, data=data, needs_form_wrapper=needs_form_wrapper,
+            **kwargs)
+        if not collector.is_enabled():
+            # There's no history to show trends from.
+            del self.columns['trend']
 
     class Meta(object):
         name = "monitoring"
         verbose_name = _("Monitoring")
         hidden_title = False
+        row_actions = (GroupErrors, GroupWarnings)
+
+
+def get_share(datum):
+    return '%.1f%%' % (100.0 * datum['count'] / (datum['total'] or 1))
+
+
+class ViolationGroupsTable(tables.DataTable):
+    value = tables.Column("value", verbose_name=_("Value"))
+    count = tables.Column("count", verbose_name=_("Violations"))
+    share = tables.Column(get_share, verbose_name=_("Share"))
+
+    class Meta(object):
+        name = "violation_groups"
+        verbose_name = _("Violation Groups")
+        hidden_title = False
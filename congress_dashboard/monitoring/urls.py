@@ -19,4 +19,6 @@ from congress_dashboard.monitoring import views
 
 urlpatterns = [
     url(r'^$', views.IndexView.as_view(), name='index'),
+    url(r'^(?P<policy_name>[^/]+)/(?P<table_name>[^/]+)/groups/$',
+        views.GroupsView.as_view(), name='groups'),
 ]
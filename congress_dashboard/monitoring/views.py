@@ -12,17 +12,31 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import itertools
 import logging
+import time
 
+from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
+from horizon import exceptions
 from horizon import messages
 from horizon import tables
 
+from congress_dashboard.api import congress
 import congress_dashboard.datasources.utils as ds_utils
+from congress_dashboard.monitoring import aggregation
+from congress_dashboard.monitoring import collector
+from congress_dashboard.monitoring import history
 from congress_dashboard.monitoring import tables as monitor_tables
 
 LOG = logging.getLogger(__name__)
 
+# Seconds of history shown in the trend of each policy.
+TREND_PERIOD = 24 * 3600
+
+# Default number of groups shown when grouping violations.
+GROUPS_LIMIT = 20
+
 
 class IndexView(tables.DataTableView):
     """List policy violations."""
@@ -31,10 +45,129 @@ class IndexView(tables.DataTableView):
 
     def get_data(self):
         try:
+            if collector.is_enabled():
+                collector.start()
+                latest = history.get_latest()
+                if latest is not None:
+                    return self._get_recorded_violations_data(latest[1])
+                LOG.debug('No recent violations recorded by the collector, '
+                          'counting them now')
             violations_data = ds_utils.get_policy_violations_data(self.request)
+            self._set_trends(violations_data)
             return violations_data
         except Exception as e:
             msg = _('Unable to policy violations data: %s') % str(e)
             LOG.exception(msg)
             messages.error(self.request, msg)
             return []
+
+    def _get_recorded_violations_data(self, counts):
+        """Build the table from the counts recorded by the collector."""
+        try:
+            policies = congress.policies_index(self.request)
+        except Exception as e:
+            LOG.error('Unable to get list of policies: %s', str(e))
+            policies = None
+
+        violations_data = []
+        for policy_name, (errors, warnings) in sorted(counts.items()):
+            if not errors and not warnings:
+                continue
+            row = congress.PolicyTable({'id': policy_name})
+            row.set_id_as_name_if_empty()
+            policy = policies and policies.get_by_name(policy_name)
+            if policy:
+                row.set_policy_details(policy)
+            else:
+                row.set_value('policy_name', policy_name)
+            if errors:
+                row.set_value('error', errors)
+            if warnings:
+                row.set_value('warning', warnings)
+            violations_data.append(row)
+        self._set_trends(violations_data)
+        return violations_data
+
+    def _set_trends(self, violations_data):
+        if not collector.is_enabled():
+            return
+        series = history.get_store().series(time.time() - TREND_PERIOD)
+        for row in violations_data:
+            row.set_value('trend', series.get(row['policy_name'], []))
+
+
+class GroupsView(tables.DataTableView):
+    """Count the violations of a policy table by the values of a column."""
+    table_class = monitor_tables.ViolationGroupsTable
+    template_name = 'admin/monitoring/groups.html'
+
+    def _get_column_names(self, policy_name, table_name):
+        try:
+            schema = congress.policy_table_schema_get(self.request,
+                                                      policy_name, table_name)
+            return [c['name'] for c in schema['columns']]
+        except Exception as e:
+            LOG.info('Unable to get schema of table "%s" of policy "%s": %s',
+                     table_name, policy_name, str(e))
+            return []
+
+    def _get_limit(self):
+        try:
+            return max(int(self.request.GET.get('limit', GROUPS_LIMIT)), 1)
+        except ValueError:
+            return GROUPS_LIMIT
+
+    def get_data(self):
+        policy_name = self.kwargs['policy_name']
+        table_name = self.kwargs['table_name']
+        column_names = self._get_column_names(policy_name, table_name)
+        column = self.request.GET.get('column')
+        self.column_names = column_names
+        self.column = column
+        self.total = 0
+        try:
+            rows = congress.policy_rows_iter(self.request, policy_name,
+                                             table_name)
+            first = next(rows, None)
+            if first is None:
+                return []
+            if len(first) != len(column_names):
+                # Rows of another table with the same name and a different
+                # arity. Number the columns.
+                column_names = [str(i) for i in range(len(first))]
+                self.column_names = column_names
+            if column not in column_names:
+                column = self.column = column_names[0]
+            encoded = aggregation.encode_column(
+                itertools.chain([first], rows), column_names.index(column))
+        except Exception as e:
+            msg_args = {
+                'table_name': table_name,
+                'policy_name': policy_name,
+                'error': str(e)
+            }
+            msg = _('Unable to group rows in table "%(table_name)s", policy '
+                    '"%(policy_name)s": %(error)s') % msg_args
+            messages.error(self.request, msg)
+            redirect = reverse('horizon:admin:monitoring:index')
+            raise exceptions.Http302(redirect)
+
+        self.total = len(encoded)
+        groups = []
+        for value, count in aggregation.top_groups(encoded,
+                                                   self._get_limit()):
+            group = congress.PolicyAPIDictWrapper(
+                {'id': str(value), 'value': value, 'count': count,
+                 'total': self.total})
+            groups.append(group)
+        return groups
+
+    def get_context_data(self, **kwargs):
+        context = super(GroupsView, self).get_context_data(**kwargs)
+        context['policy_name'] = self.kwargs['policy_name']
+        context['table_name'] = self.kwargs['table_name']
+        context['column_names'] = self.column_names
+        context['column'] = self.column
+        context['limit'] = self._get_limit()
+        context['total'] = self.total
+        return context
@@ -20,7 +20,10 @@ from horizon import exceptions
 from horizon import forms
 from horizon import messages
 
+from congress_dashboard.api import cache
+from congress_dashboard.api import concurrency
 from congress_dashboard.api import congress
+from congress_dashboard.api import datalog
 
 LOG = logging.getLogger(__name__)
 
@@ -65,3 +68,103 @@ class CreateRawRule(forms.SelfHandlingForm):
             messages.error(self.request, msg)
             redirect = reverse(self.failure_url, args=(policy_name,))
             raise exceptions.Http302(redirect)
+
+
+class ImportRules(forms.SelfHandlingForm):
+    rules = forms.CharField(
+        label=_("Rules"), required=False,
+        widget=forms.Textarea(attrs={'rows': 12}),
+        help_text=_("Rules in policy rule language, one after the other. "
+                    "Lines such as '# name: ...' and '# comment: ...' "
+                    "before a rule set its name and description."))
+    rules_file = forms.FileField(
+        label=_("Rules File"), required=False,
+        help_text=_("A file of rules, in the same format, imported instead "
+                    "of the rules entered above."))
+    rollback = forms.BooleanField(
+        label=_("Roll Back on Failure"), required=False,
+        help_text=_("Delete the rules already created if any rule fails."))
+    failure_url = 'horizon:admin:policies:detail'
+
+    def __init__(self, request, *args, **kwargs):
+        super(ImportRules, self).__init__(request, *args, **kwargs)
+        initial = kwargs.get('initial', {})
+        policy_name = initial.get('policy_name')
+        self.fields['policy_name'] = forms.CharField(widget=forms.HiddenInput,
+                                                     initial=policy_name)
+
+    def clean(self):
+        cleaned_data = super(ImportRules, self).clean()
+        rules_file = cleaned_data.get('rules_file')
+        text = cleaned_data.get('rules', '')
+        if rules_file:
+            try:
+                text = rules_file.read().decode('utf-8')
+            except UnicodeDecodeError:
+                raise forms.ValidationError(
+                    _('The rules file must be UTF-8 encoded text.'))
+        try:
+            entries = datalog.parse_rules(text)
+        except datalog.DatalogSyntaxError as e:
+            raise forms.ValidationError(
+                _('Unable to parse the rules: %s') % str(e))
+        if not entries:
+            raise forms.ValidationError(_('Enter or upload some rules.'))
+        cleaned_data['entries'] = entries
+        return cleaned_data
+
+    def _rollback(self, request, policy_name, rule_ids):
+        def delete(rule_id):
+            congress.policy_rule_delete(request, policy_name, rule_id)
+
+        with cache.deferred_invalidation(request):
+            outcomes = concurrency.map_isolated(delete, rule_ids)
+        remaining = [rule_id for rule_id, outcome in zip(rule_ids, outcomes)
+                     if outcome.error is not None]
+        if remaining:
+            msg = _('Unable to roll back, these rules were created: '
+                    '%s') % ', '.join(remaining)
+            LOG.error(msg)
+            messages.error(request, msg)
+        else:
+            messages.info(request, _('Rolled back %d created rules.') %
+                          len(rule_ids))
+
+    def handle(self, request, data):
+        policy_name = data['policy_name']
+        entries = data['entries']
+
+        def create(entry):
+            params = {
+                'name': entry.name,
+                'comment': entry.comment,
+                'rule': entry.rule,
+            }
+            return congress.policy_rule_create(request, policy_name,
+                                               body=params)
+
+        with cache.deferred_invalidation(request):
+            outcomes = concurrency.map_isolated(create, entries)
+        created = []
+        failed = 0
+        for entry, outcome in zip(entries, outcomes):
+            if outcome.error is None:
+                created.append(outcome.value['id'])
+                continue
+            failed += 1
+            msg_args = {'line': entry.line, 'name': entry.name or entry.rule,
+                        'error': str(outcome.error)}
+            msg = _('Error creating rule "%(name)s" on line %(line)d: '
+                    '%(error)s') % msg_args
+            LOG.error(msg)
+            messages.error(request, msg)
+
+        if failed and data['rollback'] and created:
+            self._rollback(request, policy_name, created)
+            return True
+        if created:
+            msg_args = {'created': len(created), 'total': len(entries)}
+            msg = _('Imported %(created)d of %(total)d rules.') % msg_args
+            LOG.info(msg)
+            messages.success(request, msg)
+        return True
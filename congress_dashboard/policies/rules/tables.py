@@ -14,16 +14,14 @@
 
 import logging
 
-from django.template.defaultfilters import linebreaksbr
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ungettext_lazy
-from horizon import exceptions
-from horizon import messages
 from horizon import tables
 from openstack_dashboard import policy
 
 from congress_dashboard.api import congress
+from congress_dashboard.common import tables as common_tables
 
 
 LOG = logging.getLogger(__name__)
@@ -55,7 +53,21 @@ class CreateRawRule(tables.LinkAction):
         return reverse(self.url, args=(policy_name,))
 
 
-class DeleteRule(policy.PolicyTargetMixin, tables.DeleteAction):
+class ImportRules(tables.LinkAction):
+    name = 'import_rules'
+    verbose_name = _('Import Rules')
+    url = 'horizon:admin:policies:import_rules'
+    classes = ('ajax-modal',)
+    icon = 'upload'
+    policy_rules = (('policy', 'create_raw_rule'),)
+
+    def get_link_url(self, datum=None):
+        policy_name = self.table.kwargs['policy_name']
+        return reverse(self.url, args=(policy_name,))
+
+
+class DeleteRule(policy.PolicyTargetMixin, common_tables.ConcurrentBatchMixin,
+                 tables.DeleteAction):
     @staticmethod
     def action_present(count):
         return ungettext_lazy(
@@ -72,24 +84,13 @@ class DeleteRule(policy.PolicyTargetMixin, tables.DeleteAction):
             count
         )
 
-    redirect_url = 'horizon:admin:policies:detail'
-
     def delete(self, request, obj_id):
         policy_name = self.table.kwargs['policy_name']
         LOG.info('User %s deleting policy "%s" rule "%s" in tenant %s',
                  request.user.username, policy_name, obj_id,
                  request.user.tenant_name)
-        try:
-            congress.policy_rule_delete(request, policy_name, obj_id)
-            LOG.info('Deleted policy rule "%s"', obj_id)
-        except Exception as e:
-            msg_args = {'rule_id': obj_id, 'error': str(e)}
-            msg = _('Failed to delete policy rule "%(rule_id)s": '
-                    '%(error)s') % msg_args
-            LOG.error(msg)
-            messages.error(request, msg)
-            redirect = reverse(self.redirect_url, args=(policy_name,))
-            raise exceptions.Http302(redirect)
+        congress.policy_rule_delete(request, policy_name, obj_id)
+        LOG.info('Deleted policy rule "%s"', obj_id)
 
 
 class PolicyRulesTable(tables.DataTable):
@@ -97,12 +98,12 @@ class PolicyRulesTable(tables.DataTable):
     name = tables.Column("name", verbose_name=_("Name"))
     comment = tables.Column("comment", verbose_name=_("Comment"))
     rule = tables.Column("rule", verbose_name=_("Rule"),
-                         filters=(congress.format_rule, linebreaksbr,))
+                         filters=(congress.format_rule_html,))
 
     class Meta(object):
         name = "policy_rules"
         verbose_name = _("Rules")
-        table_actions = (CreateRule, CreateRawRule, DeleteRule,)
+        table_actions = (CreateRule, CreateRawRule, ImportRules, DeleteRule,)
         row_actions = (DeleteRule,)
         hidden_title = False
 
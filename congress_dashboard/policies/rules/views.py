@@ -51,3 +51,23 @@ class CreateRawView(forms.ModalFormView):
     def get_success_url(self):
         return reverse(self.success_url,
                        args=(self.kwargs['policy_name'],))
+
+
+class ImportView(forms.ModalFormView):
+    form_class = rule_forms.ImportRules
+    template_name = 'admin/policies/rules/import.html'
+    success_url = 'horizon:admin:policies:detail'
+
+    def get_context_data(self, **kwargs):
+        context = super(ImportView, self).get_context_data(**kwargs)
+        context["policy_name"] = self.kwargs['policy_name']
+        return context
+
+    def get_initial(self):
+        initial = super(ImportView, self).get_initial()
+        initial.update({'policy_name': self.kwargs['policy_name']})
+        return initial
+
+    def get_success_url(self):
+        return reverse(self.success_url,
+                       args=(self.kwargs['policy_name'],))
@@ -23,6 +23,7 @@ from horizon import forms
 from horizon import workflows
 
 from congress_dashboard.api import congress
+from congress_dashboard.api import datalog
 
 
 COLUMN_FORMAT = '<datasource>%s<table> <column>' % congress.TABLE_SEPARATOR
@@ -216,14 +217,15 @@ class CreateRule(workflows.Workflow):
         except Exception:
             # Maybe it's a policy table, not a service.
             try:
-                schema = congress.policy_table_schema_get(
-                    request, datasource, table_name)
+                schemas = congress.policy_table_schemas_get(request,
+                                                            datasource)
             except Exception as e:
                 # Nope.
                 LOG.error('Unable to get schema for table "%s", '
                           'datasource "%s": %s',
                           table_name, datasource, str(e))
                 return str(e)
+            schema = schemas.get(table_name, {'columns': []})
         return schema['columns']
 
     def handle(self, request, data):
@@ -388,10 +390,10 @@ class CreateRule(workflows.Workflow):
                         column_variables.get(table_column, 'col_%s' %
                                              column_count))
                     column_count += 1
-                literals.append('%s(%s)' % (table, ', '.join(literal_columns)))
+                literals.append(datalog.build_literal(table, literal_columns))
             else:
                 # Just the table name, such as for classification:true.
-                literals.append(table)
+                literals.append(datalog.build_literal(table))
 
         # Form the negated tables.
         for table in negation_tables:
@@ -410,18 +412,18 @@ class CreateRule(workflows.Workflow):
                 else:
                     literal_columns.append('col_%s' % column_count)
                     column_count += 1
-            literal = 'not %s(%s)' % (table, ', '.join(literal_columns))
-            literals.append(literal)
+            literals.append(datalog.build_literal(table, literal_columns,
+                                                  negated=True))
 
             # Every column in the negated table must appear in a non-negated
             # literal in the body. If there are some variables that have not
             # been used elsewhere, repeat the literal in its non-negated form.
             if num_variables != len(columns) and table not in body_tables:
-                literals.append(literal.replace('not ', ''))
+                literals.append(datalog.build_literal(table, literal_columns))
 
         # All together now.
-        rule = '%s(%s) %s %s' % (policy_table, ', '.join(head_columns),
-                                 congress.RULE_SEPARATOR, ', '.join(literals))
+        rule = datalog.build_rule(
+            datalog.build_literal(policy_table, head_columns), literals)
         LOG.info('User %s creating policy "%s" rule "%s" in tenant %s: %s',
                  username, policy_name, rule_name, project_name, rule)
         try:
@@ -17,12 +17,11 @@ import logging
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ungettext_lazy
-from horizon import exceptions
-from horizon import messages
 from horizon import tables
 from openstack_dashboard import policy
 
 from congress_dashboard.api import congress
+from congress_dashboard.common import tables as common_tables
 
 
 LOG = logging.getLogger(__name__)
@@ -40,7 +39,8 @@ class CreatePolicy(tables.LinkAction):
     icon = 'plus'
 
 
-class DeletePolicy(policy.PolicyTargetMixin, tables.DeleteAction):
+class DeletePolicy(policy.PolicyTargetMixin,
+                   common_tables.ConcurrentBatchMixin, tables.DeleteAction):
     @staticmethod
     def action_present(count):
         return ungettext_lazy(
@@ -57,22 +57,11 @@ class DeletePolicy(policy.PolicyTargetMixin, tables.DeleteAction):
             count
         )
 
-    redirect_url = 'horizon:admin:policies:index'
-
     def delete(self, request, obj_id):
         LOG.info('User %s deleting policy "%s" in tenant %s',
                  request.user.username, obj_id, request.user.tenant_name)
-        try:
-            congress.policy_delete(request, obj_id)
-            LOG.info('Deleted policy "%s"', obj_id)
-        except Exception as e:
-            msg_args = {'policy_id': obj_id, 'error': str(e)}
-            msg = _('Failed to delete policy "%(policy_id)s": '
-                    '%(error)s') % msg_args
-            LOG.error(msg)
-            messages.error(request, msg)
-            redirect = reverse(self.redirect_url)
-            raise exceptions.Http302(redirect)
+        congress.policy_delete(request, obj_id)
+        LOG.info('Deleted policy "%s"', obj_id)
 
     def allowed(self, request, policy=None):
         # Only user policies can be deleted.
@@ -26,11 +26,18 @@ POLICYTABLE = r'^(?P<datasource_id>[^/]+)/(?P<policy_table_name>[^/]+)/%s$'
 urlpatterns = [
     url(r'^$', views.IndexView.as_view(), name='index'),
     url(r'^create/$', views.CreateView.as_view(), name='create'),
+    url(r'^autocomplete/$', views.AutocompleteView.as_view(),
+        name='autocomplete'),
+    url(r'^catalog/$', views.CatalogView.as_view(), name='catalog'),
     url(POLICY % 'detail', views.DetailView.as_view(), name='detail'),
     url(POLICYTABLE % 'detail', data_views.DetailView.as_view(),
         name='policy_table_detail'),
+    url(POLICYTABLE % 'export', data_views.ExportView.as_view(),
+        name='policy_table_export'),
     url(POLICY % 'rules/create_raw',
         rule_views.CreateRawView.as_view(), name='create_raw_rule'),
     url(POLICY % 'rules/create',
         rule_views.CreateView.as_view(), name='create_rule'),
+    url(POLICY % 'rules/import',
+        rule_views.ImportView.as_view(), name='import_rules'),
 ]
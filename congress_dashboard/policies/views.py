@@ -12,13 +12,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import json
 import logging
 
-from django.template.defaultfilters import dictsort
+from django import http
 from django.urls import reverse
 from django.urls import reverse_lazy
+from django.utils import cache as http_cache
 from django.utils.translation import ugettext_lazy as _
+from django.views import generic
 from horizon import exceptions
 from horizon import forms
 from horizon import messages
@@ -117,41 +118,60 @@ class DetailView(tables.MultiTableView):
             redirect = reverse('horizon:admin:policies:index')
             raise exceptions.Http302(redirect)
         context['policy'] = policy
-
-        # Alphabetize and convert list of data source tables and columns into
-        # JSON formatted string consumable by JavaScript. Do this here instead
-        # of in the Create Rule form so that the tables and columns lists
-        # appear in the HTML document before the JavaScript that uses them.
-        all_tables = ds_utils.get_datasource_tables(self.request)
-        sorted_datasources = dictsort(all_tables, 'datasource')
-        tables = []
-        for ds in sorted_datasources:
-            datasource_tables = ds['tables']
-            datasource_tables.sort()
-            for table in ds['tables']:
-                tables.append('%s%s%s' % (ds['datasource'],
-                                          congress.TABLE_SEPARATOR, table))
-        context['tables'] = json.dumps(tables)
-
-        datasource_columns = ds_utils.get_datasource_columns(self.request)
-        sorted_datasources = dictsort(datasource_columns, 'datasource')
-        columns = []
-        for ds in sorted_datasources:
-            sorted_tables = dictsort(ds['tables'], 'table')
-            for tbl in sorted_tables:
-                # Ignore service-derived tables, which are already included.
-                if congress.TABLE_SEPARATOR in tbl['table']:
-                    continue
-                table_columns = tbl['columns']
-                if table_columns:
-                    table_columns.sort()
-                else:
-                    # Placeholder name for column when the table has none.
-                    table_columns = ['_']
-
-                for column in table_columns:
-                    columns.append('%s%s%s %s' % (ds['datasource'],
-                                                  congress.TABLE_SEPARATOR,
-                                                  tbl['table'], column))
-        context['columns'] = json.dumps(columns)
         return context
+
+
+class AutocompleteView(generic.View):
+    """Look up the tables or columns of the rule catalog by prefix.
+
+    Used by the rule construction form, so that policy pages don't need to
+    embed the whole catalog of data source tables and columns.
+    """
+    kinds = ('tables', 'columns')
+    limit = 50
+
+    def get(self, request):
+        kind = request.GET.get('kind')
+        if kind not in self.kinds:
+            return http.HttpResponseBadRequest()
+        term = request.GET.get('term', '')
+        try:
+            limit = max(min(int(request.GET.get('limit', self.limit)),
+                            self.limit), 1)
+        except ValueError:
+            limit = self.limit
+
+        try:
+            version, index = ds_utils.get_catalog_index(request, kind)
+        except Exception as e:
+            LOG.error('Unable to get the %s of the rule catalog: %s',
+                      kind, str(e))
+            return http.JsonResponse({'results': []}, status=503)
+        results = index.search(term, limit)
+        return http.JsonResponse({'version': version, 'results': results})
+
+
+class CatalogView(generic.View):
+    """Get the whole rule catalog, for browsers to keep locally.
+
+    The catalog's version is its ETag. A conditional GET whose If-None-Match
+    holds the version a browser already has gets an empty 304 response, so
+    checking that a stored catalog is current costs no transfer. The catalog
+    is cached, so while it is, the check costs no Congress call either.
+    """
+
+    def get(self, request):
+        try:
+            catalog = ds_utils.get_rule_catalog(request)
+        except Exception as e:
+            LOG.error('Unable to get the rule catalog: %s', str(e))
+            return http.JsonResponse({}, status=503)
+
+        etag = '"%s"' % catalog['version']
+        response = http_cache.get_conditional_response(request, etag=etag)
+        if response is None:
+            response = http.JsonResponse(catalog)
+        response['ETag'] = etag
+        # Browsers must check the version before reusing the catalog.
+        http_cache.patch_cache_control(response, private=True, no_cache=True)
+        return response
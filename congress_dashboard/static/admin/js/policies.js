@@ -1,4 +1,131 @@
 horizon.policies = {
+  /* Milliseconds to wait after a keystroke before looking up the catalog. */
+  catalogDelay: 100,
+
+  /* Maximum number of entries suggested. */
+  catalogLimit: 50,
+
+  /* Results of server-side catalog lookups, by kind and term. */
+  catalogResults: {},
+
+  /* Promise of the catalog's prefix indexes, once requested. */
+  catalogRequest: null,
+
+  /* Prefix index over catalog entries, matching the whole text of entries
+     or any of their words, like the server-side index. */
+  CatalogIndex: function(entries) {
+    var keys = [];
+    for (var i = 0; i < entries.length; i++) {
+      var text = entries[i].toLowerCase();
+      keys.push([text, i]);
+      for (var j = 0; j < text.length - 1; j++) {
+        if (text[j] == ':' || text[j] == ' ') {
+          keys.push([text.substring(j + 1), i]);
+        }
+      }
+    }
+    keys.sort(function(a, b) {
+      return a[0] < b[0] ? -1 : a[0] > b[0] ? 1 : a[1] - b[1];
+    });
+    this.entries = entries;
+    this.keys = keys;
+  },
+
+  /* Key under which the catalog of the current project and region is
+     stored in the browser. */
+  catalogStorageKey: function() {
+    return 'congress.catalog.' + $('#ds_catalog').attr('data-scope');
+  },
+
+  readStoredCatalog: function() {
+    try {
+      var stored = window.localStorage.getItem(
+        horizon.policies.catalogStorageKey());
+      return stored ? JSON.parse(stored) : null;
+    } catch (e) {
+      return null;
+    }
+  },
+
+  storeCatalog: function(catalog) {
+    try {
+      window.localStorage.setItem(horizon.policies.catalogStorageKey(),
+                                  JSON.stringify(catalog));
+    } catch (e) {
+      /* Storage disabled or full, the catalog is only kept in the page. */
+    }
+  },
+
+  /* Get a promise of the catalog's prefix indexes. The catalog stored in
+     the browser is revalidated with its version, so that it is only
+     downloaded again when it has changed. */
+  loadCatalog: function() {
+    if (horizon.policies.catalogRequest) {
+      return horizon.policies.catalogRequest;
+    }
+    var stored = horizon.policies.readStoredCatalog();
+    var headers = {};
+    if (stored && stored.version) {
+      headers['If-None-Match'] = '"' + stored.version + '"';
+    }
+    horizon.policies.catalogRequest = $.ajax({
+      url: $('#ds_catalog').attr('data-catalog-url'),
+      dataType: 'json',
+      headers: headers
+    }).then(function(data, status, xhr) {
+      var catalog = data;
+      if (xhr.status == 304 || !data) {
+        catalog = stored;
+      } else {
+        horizon.policies.storeCatalog(data);
+      }
+      return {
+        tables: new horizon.policies.CatalogIndex(catalog.tables),
+        columns: new horizon.policies.CatalogIndex(catalog.columns)
+      };
+    }, function() {
+      /* Try again next time. */
+      horizon.policies.catalogRequest = null;
+      return $.Deferred().reject().promise();
+    });
+    return horizon.policies.catalogRequest;
+  },
+
+  /* Look up 'tables' or 'columns' of the catalog on the server. */
+  searchCatalogRemotely: function(kind, term, response) {
+    var key = kind + ' ' + term;
+    var results = horizon.policies.catalogResults;
+    if (results.hasOwnProperty(key)) {
+      response(results[key]);
+      return;
+    }
+    $.getJSON($('#ds_catalog').attr('data-url'), {kind: kind, term: term})
+      .done(function(data) {
+        results[key] = data.results;
+        response(data.results);
+      })
+      .fail(function() {
+        response([]);
+      });
+  },
+
+  /* Get an autocompletion source looking up 'tables' or 'columns' of the
+     catalog by prefix, in the browser once the catalog is loaded, or on the
+     server when it can't be. */
+  catalogSource: function(kind) {
+    return function(request, response) {
+      horizon.policies.loadCatalog()
+        .done(function(catalog) {
+          response(catalog[kind].search(request.term,
+                                        horizon.policies.catalogLimit));
+        })
+        .fail(function() {
+          horizon.policies.searchCatalogRemotely(kind, request.term,
+                                                 response);
+        });
+    };
+  },
+
   /* Update input attributes for column name autocompletion. */
   updateColumnAcInput: function($input) {
     $input.attr({
@@ -125,7 +252,8 @@ horizon.addInitFunction(horizon.policies.init = function() {
           /* Add autocompletion. */
           $('#mapping_column_' + cid).autocomplete({
             minLength: 0,
-            source: JSON.parse($('#ds_columns').text())
+            source: horizon.policies.catalogSource('columns'),
+            delay: horizon.policies.catalogDelay
           });
           $('#mapping_' + cid).find('.ac div.form-control-feedback')
               .click(function() {
@@ -164,7 +292,8 @@ horizon.addInitFunction(horizon.policies.init = function() {
     /* Add autocompletion. */
     $('#join_left_' + cid + ', #join_right_' + cid).autocomplete({
       minLength: 0,
-      source: JSON.parse($('#ds_columns').text())
+      source: horizon.policies.catalogSource('columns'),
+      delay: horizon.policies.catalogDelay
     });
     horizon.policies.updateColumnAcInput($('#join_right_' + cid));
     $('#join_' + cid).find('.ac div.form-control-feedback').click(function() {
@@ -191,7 +320,8 @@ horizon.addInitFunction(horizon.policies.init = function() {
     if (!$select.val()) {
       $input.autocomplete({
         minLength: 0,
-        source: JSON.parse($('#ds_columns').text())
+        source: horizon.policies.catalogSource('columns'),
+        delay: horizon.policies.catalogDelay
       });
       horizon.policies.updateColumnAcInput($input);
     } else {
@@ -225,7 +355,8 @@ horizon.addInitFunction(horizon.policies.init = function() {
     /* Add autocompletion. */
     $('#negation_value_' + cid + ', #negation_column_' + cid).autocomplete({
       minLength: 0,
-      source: JSON.parse($('#ds_columns').text())
+      source: horizon.policies.catalogSource('columns'),
+      delay: horizon.policies.catalogDelay
     });
     $('#negation_' + cid).find('.ac div.form-control-feedback')
         .click(function() {
@@ -267,7 +398,8 @@ horizon.addInitFunction(horizon.policies.init = function() {
     /* Add autocompletion. */
     $('#alias_column_' + cid).autocomplete({
       minLength: 0,
-      source: JSON.parse($('#ds_tables').text())
+      source: horizon.policies.catalogSource('tables'),
+      delay: horizon.policies.catalogDelay
     });
     $('#alias_' + cid).find('.ac div.form-control-feedback')
         .click(function() {
@@ -286,3 +418,46 @@ horizon.addInitFunction(horizon.policies.init = function() {
     $tr.remove();
   });
 });
+
+/* Return the entries matching the prefix, those whose whole text matches
+   first, each in catalog order. */
+horizon.policies.CatalogIndex.prototype.search = function(prefix, limit) {
+  var keys = this.keys;
+  prefix = prefix.toLowerCase();
+  var low = 0;
+  var high = keys.length;
+  while (low < high) {
+    var middle = (low + high) >>> 1;
+    if (keys[middle][0] < prefix) {
+      low = middle + 1;
+    } else {
+      high = middle;
+    }
+  }
+  var whole = [];
+  var words = [];
+  var seen = {};
+  for (var i = low; i < keys.length; i++) {
+    if (keys[i][0].lastIndexOf(prefix, 0) !== 0) {
+      break;
+    }
+    var position = keys[i][1];
+    if (this.entries[position].toLowerCase().lastIndexOf(prefix, 0) === 0) {
+      whole.push(position);
+    } else {
+      words.push(position);
+    }
+  }
+  var byPosition = function(a, b) { return a - b; };
+  whole.sort(byPosition);
+  words.sort(byPosition);
+  var results = [];
+  var candidates = whole.concat(words);
+  for (i = 0; i < candidates.length && results.length < limit; i++) {
+    if (!seen[candidates[i]]) {
+      seen[candidates[i]] = true;
+      results.push(this.entries[candidates[i]]);
+    }
+  }
+  return results;
+};